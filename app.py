@@ -1,81 +1,289 @@
+import asyncio
+from fastapi import FastAPI, Response
 import gradio as gr
-import requests
-from huggingface_hub import InferenceClient
+import math
 import os
+import time
+import uvicorn
 
-# Fetch API tokens from environment variables
+from concurrency import Busy, ConcurrencyLimiter
+from context import ContextManager
+from inference_pool import InferencePool, backends_from_config
+import metrics
+from market_data import CMC_BASE_URL, UPSTREAM_ERRORS, MarketDataProvider
+from market_snapshot import MarketSnapshot
+from response_cache import ResponseCache
+from router import LLM, QUOTE, TOP_MOVERS, IntentRouter
+from streaming import StopSequenceMatcher, StreamStats
+
+# Fetch API tokens from environment variables; they can be omitted when pointing at
+# self-hosted or stub endpoints (see benchmarks/stubs.py)
+HF_MODEL = os.getenv("HF_MODEL", "HuggingFaceH4/zephyr-7b-beta")
 HF_API_TOKEN = os.getenv("HF_API_TOKEN")
-if not HF_API_TOKEN:
-    raise ValueError("Hugging Face API token not found. Please set HF_API_TOKEN environment variable")
+INFERENCE_BACKENDS = backends_from_config(
+    os.getenv("INFERENCE_BACKENDS", HF_MODEL),
+    default_token=HF_API_TOKEN,
+    timeout=float(os.getenv("INFERENCE_TIMEOUT", 0)) or None,
+    pool_size=int(os.getenv("INFERENCE_POOL_SIZE", 64)),
+)
+for backend in INFERENCE_BACKENDS:
+    if not backend.token and not backend.model.startswith(("http://", "https://")):
+        raise ValueError("Hugging Face API token not found. Please set HF_API_TOKEN environment variable")
 CMC_API_KEY = os.getenv("CMC_API_KEY")
-if not CMC_API_KEY:
+if not CMC_API_KEY and not os.getenv("CMC_BASE_URL"):
     raise ValueError("CoinMarketCap API key not found. Please set CMC_API_KEY environment variable")
 
-# Initialize the HuggingFace Inference Client
-client = InferenceClient(model="HuggingFaceH4/zephyr-7b-beta", token=HF_API_TOKEN)
-CMC_BASE_URL_LATEST = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest"
-HEADERS = {"X-CMC_PRO_API_KEY": CMC_API_KEY}
-
-def get_top_movers_1h():
-    params = {
-        "start": "1",
-        "limit": "10",
-        "sort": "percent_change_1h",
-        "convert": "USD",
-    }
-    try:
-        response = requests.get(CMC_BASE_URL_LATEST, headers=HEADERS, params=params)
-        response.raise_for_status()
-        data = response.json()
-        coins = [
-            f"{coin['name']} ({coin['symbol']}): ${coin['quote']['USD']['price']:.2f}, 1h Change: {coin['quote']['USD']['percent_change_1h']:.2f}%"
-            for coin in data["data"]
-        ]
-        return "\n".join(coins) if coins else "No top movers found! Sorry brother."
-    except requests.RequestException as e:
-        return f"Error: {str(e)}"
-
-def respond(message, history, system_message, max_tokens, temperature, top_p):
+# Spreads generations over the configured backends, failing over (and optionally hedging) on slow or dead ones
+inference_pool = InferencePool(
+    INFERENCE_BACKENDS,
+    hedge=os.getenv("INFERENCE_HEDGE", "0") != "0",
+    hedge_percentile=float(os.getenv("INFERENCE_HEDGE_PERCENTILE", 95)),
+    hedge_min_delay=float(os.getenv("INFERENCE_HEDGE_MIN_DELAY", 0.25)),
+)
+
+# Bound in-flight generations so slow streams can't starve everyone else
+limiter = ConcurrencyLimiter(
+    max_concurrent=int(os.getenv("MAX_CONCURRENT_GENERATIONS", 64)),
+    per_session=int(os.getenv("MAX_GENERATIONS_PER_SESSION", 2)),
+    max_queue=int(os.getenv("MAX_QUEUED_GENERATIONS", 256)),
+)
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", 60))
+
+# Keeps prompts inside zephyr's context window, summarizing turns that no longer fit
+context_manager = ContextManager(
+    context_window=int(os.getenv("CONTEXT_WINDOW_TOKENS", 4096)),
+    summarize=os.getenv("CONTEXT_SUMMARY", "1") != "0",
+    summary_tokens=int(os.getenv("CONTEXT_SUMMARY_TOKENS", 256)),
+)
+
+# Shared CoinMarketCap client: pooled connections, TTL cache and background refresh
+market_data = MarketDataProvider(
+    CMC_API_KEY or "",
+    base_url=os.getenv("CMC_BASE_URL", CMC_BASE_URL),
+    ttl=float(os.getenv("CMC_CACHE_TTL", 60)),
+    refresh_interval=float(os.getenv("CMC_REFRESH_INTERVAL", 30)),
+    max_stale=float(os.getenv("CMC_MAX_STALE", 900)),
+)
+
+# Whole-market listings held in NumPy columns; top movers and quotes are answered locally from it
+market_snapshot = MarketSnapshot(
+    market_data,
+    size=int(os.getenv("MARKET_SNAPSHOT_SIZE", 5000)),
+    page_size=int(os.getenv("MARKET_SNAPSHOT_PAGE_SIZE", 1000)),
+    refresh_interval=float(os.getenv("MARKET_SNAPSHOT_REFRESH", 60)),
+)
+# Skips illiquid coins whose % moves are mostly noise; 0 keeps everything
+MOVERS_MIN_VOLUME = float(os.getenv("MOVERS_MIN_VOLUME", 0)) or None
+
+# Finished replies for repeated prompts ("gm", "wen moon"), skipping generation entirely
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 2048))
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", 3600)),
+    max_variants=int(os.getenv("RESPONSE_CACHE_VARIANTS", 4)),
+    path=os.getenv("RESPONSE_CACHE_PATH"),
+) if RESPONSE_CACHE_SIZE > 0 else None
+
+# Time-to-first-token and wasted-token totals for streamed replies
+stream_stats = StreamStats()
+
+MOVER_LABELS = {
+    "percent_change_1h": "1h Change",
+    "percent_change_24h": "24h Change",
+    "percent_change_7d": "7d Change",
+    "volume_24h": "24h Volume",
+}
+
+def _price_text(price):
+    if math.isnan(price):
+        return "n/a"
+    if price >= 1 or price <= 0:
+        return f"${price:,.2f}"
+    # Memecoins trade far below a cent, where two decimals would read as $0.00; keep ~4 significant digits
+    return f"${price:.{max(2, 3 - math.floor(math.log10(price)))}f}"
+
+async def get_top_movers(field="percent_change_1h", ascending=False):
+    started = time.perf_counter()
+    coins = market_snapshot.top(field, 10, ascending=ascending, min_volume=MOVERS_MIN_VOLUME)
+    if coins is None:
+        # Snapshot still loading: ask CMC for just this ranking
+        try:
+            listings = await market_data.alistings(limit=10, sort=field, sort_dir="asc" if ascending else "desc")
+        except UPSTREAM_ERRORS as e:
+            metrics.ERRORS.inc("top_movers_fetch", type(e).__name__)
+            return f"Error: {str(e)}"
+        coins = [dict(coin["quote"]["USD"], name=coin["name"], symbol=coin["symbol"]) for coin in listings]
+    started = metrics.stage_done("top_movers_fetch", started)
+    label = MOVER_LABELS[field]
+    if field == "volume_24h":
+        lines = [f"{coin['name']} ({coin['symbol']}): {_price_text(coin['price'])}, {label}: ${coin[field]:,.0f}" for coin in coins]
+    else:
+        lines = [f"{coin['name']} ({coin['symbol']}): {_price_text(coin['price'])}, {label}: {coin[field]:.2f}%" for coin in coins]
+    metrics.stage_done("top_movers_format", started)
+    return "\n".join(lines) if lines else "No top movers found! Sorry brother."
+
+async def get_quote(symbol):
+    started = time.perf_counter()
+    coin = market_snapshot.quote(symbol)
+    if coin is None:
+        # Not loaded yet, or a coin outside the snapshot
+        try:
+            coin = await market_data.aquote(symbol)
+        except UPSTREAM_ERRORS as e:
+            metrics.ERRORS.inc("quote_fetch", type(e).__name__)
+            return f"Error: {str(e)}"
+        if coin is not None:
+            coin = dict(coin["quote"]["USD"], name=coin["name"], symbol=coin["symbol"])
+    started = metrics.stage_done("quote_fetch", started)
+    if coin is None:
+        return f"Idk any coin called {symbol} bro."
+    metrics.stage_done("quote_format", started)
+    return f"{coin['name']} ({coin['symbol']}): {_price_text(coin['price'])}, 1h Change: {coin['percent_change_1h']:.2f}%, 24h Change: {coin['percent_change_24h']:.2f}%"
+
+# Routes each message to a market-data handler or the LLM; the coin lexicon comes from the market snapshot
+router = IntentRouter()
+_lexicon_version = None
+
+def sync_lexicon():
+    # Rebuilt only when the snapshot gains coins, not on every price refresh
+    global _lexicon_version
+    version = market_snapshot.membership_version
+    if version != _lexicon_version:
+        router.update_lexicon(market_snapshot.coins())
+        _lexicon_version = version
+
+ROUTE_HANDLERS = {
+    TOP_MOVERS: lambda route: get_top_movers(route.field, route.ascending),
+    QUOTE: lambda route: get_quote(route.symbol),
+}
+
+async def respond(message, history, system_message, max_tokens, temperature, top_p, request: gr.Request = None):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + REQUEST_DEADLINE
+    session_id = request.session_hash if request is not None else None
+    parts = []
+    # `stage` names whatever is running, so an exception is counted against the step that raised it
+    request_started = mark = time.perf_counter()
+    stage = "route"
+    route_name = "unrouted"
+    outcome = "ok"
     try:
         # Create a more specific system message that prevents self-dialogue
         enhanced_system_message = system_message + "\nIMPORTANT: You must only respond as the assistant. Never generate or include user messages in your responses. Wait for the user to ask questions and respond directly to them. Do not create fictional dialogue or responses from the user."
         
-        # Add system context
-        messages = [{"role": "system", "content": enhanced_system_message}]
+        # Market questions are answered from CoinMarketCap instead of the LLM
+        sync_lexicon()
+        route = router.route(message)
+        route_name = route.handler
+        mark = metrics.stage_done(stage, mark)
+        if route.handler != LLM:
+            stage = route.handler
+            async with asyncio.timeout_at(deadline):
+                reply = await ROUTE_HANDLERS[route.handler](route)
+            if reply.startswith("Error:"):
+                outcome = "error"
+            yield reply
+            return
         
-        # Add conversation history with explicit roles
-        for human, assistant in history:
-            messages.append({"role": "user", "content": human})
-            messages.append({"role": "assistant", "content": assistant})
+        # Fit system prompt, history and the new message into the context window
+        stage = "prompt_build"
+        messages, context_stats = context_manager.build(enhanced_system_message, history, message, max_tokens)
+        metrics.PROMPT_TOKENS.observe(context_stats["prompt_tokens"])
+        metrics.CONTEXT_TURNS_TRIMMED.observe(context_stats["turns_trimmed"])
+        if context_stats["over_budget"]:
+            metrics.CONTEXT_OVER_BUDGET.inc()
         
-        # Add current message
-        messages.append({"role": "user", "content": message})
+        cache_key = None
+        if response_cache is not None:
+            cache_key = response_cache.key(message, system_message, history, max_tokens, temperature, top_p)
+            cached = response_cache.get(cache_key, temperature)
+            if cached is not None:
+                outcome = "cached"
+                metrics.stage_done(stage, mark)
+                yield cached
+                return
+        mark = metrics.stage_done(stage, mark)
         
-        # Check for crypto-related keywords
-        if any(keyword in message.lower() for keyword in ["coin", "market", "ticker", "pump", "memecoin"]):
-            return get_top_movers_1h()
+        stage = "queue"
+        async with limiter.slot(session_id, deadline):
+            mark = metrics.stage_done(stage, mark)
+            # Stream the response via Hugging Face API, cutting it off as soon as the model
+            # starts writing the user's side of the conversation
+            started = mark
+            ttft = None
+            tokens_received = 0
+            tokens_held = 0
+            matcher = StopSequenceMatcher()
+            stream = None
+            try:
+                # The pool returns once some backend has streamed its first token
+                stage = "upstream_connect"
+                async with asyncio.timeout_at(deadline):
+                    stream = await inference_pool.chat_completion(
+                        messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        top_p=top_p,
+                    )
+                metrics.STAGE_SECONDS.observe(stream.connected_at - mark, "upstream_connect")
+                metrics.STAGE_SECONDS.observe(stream.first_token_at - stream.connected_at, "first_token")
+                mark = stream.first_token_at
+                stage = "last_token"
+                while True:
+                    # The deadline wraps each await rather than the loop body, since Gradio may
+                    # resume this generator from a different task after every yield
+                    async with asyncio.timeout_at(deadline):
+                        msg = await anext(stream, None)
+                    if msg is None:
+                        parts.append(matcher.flush())
+                        break
+                    token = msg.choices[0].delta.content
+                    if not token:
+                        continue
+                    tokens_received += 1
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                        metrics.TTFT_SECONDS.observe(ttft)
+                    text = matcher.feed(token)
+                    # Tokens whose text is still held back are wasted if a stop sequence follows
+                    tokens_held = tokens_held + 1 if matcher.pending or matcher.stopped else 0
+                    if text:
+                        parts.append(text)
+                        yield "".join(parts).lstrip()
+                    if matcher.stopped:
+                        break
+                mark = metrics.stage_done(stage, mark)
+            finally:
+                cleanup_started = time.perf_counter()
+                if stream is not None:
+                    await stream.aclose()
+                stream_stats.record(ttft, tokens_received, tokens_held if matcher.stopped else 0, matcher.stopped)
+                metrics.COMPLETION_TOKENS.observe(tokens_received)
+                metrics.stage_done("cleanup", cleanup_started)
         
-        # Generate response via Hugging Face API with role enforcement
-        response = ""
-        for msg in client.chat_completion(
-            messages,
-            max_tokens=max_tokens,
-            stream=True,
-            temperature=temperature,
-            top_p=top_p,
-        ):
-            token = msg.choices[0].delta.content
-            response += token
-            
-        # Clean up any potential user-style messages that might slip through
-        cleaned_response = response.strip()
-        if "<|user|>" in cleaned_response or "User:" in cleaned_response:
-            cleaned_response = cleaned_response.split("<|user|>")[0].strip()
-            cleaned_response = cleaned_response.split("User:")[0].strip()
-            
-        return cleaned_response
+        reply = "".join(parts).strip()
+        if cache_key is not None and reply:
+            response_cache.put(cache_key, reply, time.perf_counter() - started)
+        yield reply
+    except (GeneratorExit, asyncio.CancelledError):
+        # The user hit stop or the connection went away mid-reply
+        outcome = "cancelled"
+        raise
+    except Busy:
+        outcome = "busy"
+        yield "Phil's getting swamped rn bro, try again in a sec."
+    except TimeoutError:
+        outcome = "timeout"
+        metrics.ERRORS.inc(stage, "TimeoutError")
+        partial = "".join(parts).strip()
+        yield partial if partial else "Phil took too long to answer bro, try again."
     except Exception as e:
-        return f"Error: {str(e)}"
+        outcome = "error"
+        metrics.ERRORS.inc(stage, type(e).__name__)
+        yield f"Error: {str(e)}"
+    finally:
+        metrics.REQUESTS.inc(route_name, outcome)
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - request_started, route_name)
 
 # Gradio Chat Interface setup
 with gr.Blocks(css="#component-0 {display: none !important;} .additional-inputs {display: none !important;} footer {display: none !important;}") as demo:
@@ -92,10 +300,31 @@ with gr.Blocks(css="#component-0 {display: none !important;} .additional-inputs
             gr.Slider(minimum=0.1, maximum=4.0, value=0.7, step=0.1, label="Temperature", visible=False, container=False),
             gr.Slider(minimum=0.1, maximum=1.0, value=0.95, step=0.05, label="Top-p", visible=False, container=False)
         ],
+        # Admission is handled by `limiter`; Gradio's default of one concurrent run would serialize every chat
+        concurrency_limit=None,
         title="",
         description="Phil is here to chat, share insights, and hang out. Ask about coins, the market, tickers, or anything else!"
     )
 
+# Component stats from the caches, limiter and streams, read at scrape time
+metrics.StatsCollector("phillip_market_data", market_data.stats, registry=metrics.REGISTRY)
+metrics.StatsCollector("phillip_market_snapshot", market_snapshot.stats, registry=metrics.REGISTRY)
+metrics.StatsCollector("phillip_response_cache", lambda: response_cache.stats() if response_cache is not None else None, registry=metrics.REGISTRY)
+metrics.StatsCollector("phillip_limiter", limiter.stats, registry=metrics.REGISTRY)
+metrics.StatsCollector("phillip_context", context_manager.stats, registry=metrics.REGISTRY)
+metrics.StatsCollector("phillip_stream", stream_stats.stats, registry=metrics.REGISTRY)
+metrics.StatsCollector("phillip_inference_pool", inference_pool.stats, registry=metrics.REGISTRY)
+
+def create_server():
+    # Prometheus scrapes /metrics next to the Gradio UI on the same port
+    server = FastAPI()
+
+    @server.get("/metrics")
+    def metrics_endpoint():
+        return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+    return gr.mount_gradio_app(server, demo, path="/", show_api=False)
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
-    demo.launch(server_port=port, server_name="0.0.0.0", show_api=False)
+    uvicorn.run(create_server(), host="0.0.0.0", port=port)
@@ -0,0 +1,243 @@
+"""Offline load test: drives respond() or the Gradio app against local HF/CMC stubs.
+
+    python benchmarks/loadtest.py --sessions 200 --output results.json
+    python benchmarks/loadtest.py --mode gradio --sessions 50 --compare results.json
+
+Each simulated session replays a script from conversations.json with think time
+between turns. Results (TTFT and end-to-end percentiles, tokens/s, requests/s and
+the app's own component stats) are printed and optionally saved as JSON so runs
+can be compared.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stubs import add_stub_arguments, serve_forever
+
+BUSY_REPLY = "Phil's getting swamped"
+TIMEOUT_REPLY = "Phil took too long"
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def outcome(reply):
+    if reply is None:
+        return "empty"
+    if reply.startswith("Error:"):
+        return "error"
+    if reply.startswith(BUSY_REPLY):
+        return "busy"
+    if reply.startswith(TIMEOUT_REPLY):
+        return "timeout"
+    return "ok"
+
+
+def start_stub_process(args):
+    # The stubs get their own process so they don't compete with the app for the GIL
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    process = ctx.Process(target=serve_forever, args=(args, "127.0.0.1", 0, 0, ready), daemon=True)
+    process.start()
+    hf_url, cmc_url = ready.get(timeout=30)
+    return process, hf_url, cmc_url
+
+
+def chat_defaults(app):
+    # Use the same hidden inputs the UI sends
+    system_message, max_tokens, temperature, top_p = (component.value for component in app.chatbot.additional_inputs)
+    return system_message, max_tokens, temperature, top_p
+
+
+async def run_respond_sessions(app, args, scripts):
+    system_message, max_tokens, temperature, top_p = chat_defaults(app)
+    records = []
+
+    async def session(index):
+        rng = random.Random(args.seed + index)
+        await asyncio.sleep(rng.uniform(0, args.ramp_up))
+        request = SimpleNamespace(session_hash=f"bench-{index}")
+        history = []
+        for message in rng.choice(scripts):
+            started = time.perf_counter()
+            first = None
+            reply = None
+            async for reply in app.respond(message, history, system_message, max_tokens, temperature, top_p, request):
+                if first is None:
+                    first = time.perf_counter() - started
+            records.append({"ttft": first, "latency": time.perf_counter() - started, "outcome": outcome(reply)})
+            history.append([message, reply])
+            await asyncio.sleep(rng.expovariate(1 / args.think_time) if args.think_time else 0)
+
+    await asyncio.gather(*(session(i) for i in range(args.sessions)))
+    return records
+
+
+def run_gradio_sessions(app, args, scripts):
+    from gradio_client import Client
+
+    app.demo.launch(server_name="127.0.0.1", server_port=args.gradio_port, prevent_thread_lock=True, quiet=True)
+    url = app.demo.local_url
+    records = []
+    lock = threading.Lock()
+
+    def session(index):
+        rng = random.Random(args.seed + index)
+        time.sleep(rng.uniform(0, args.ramp_up))
+        # One client per session so each gets its own Gradio session hash. The /chat endpoint keeps
+        # the conversation in that session's state, so later turns reach respond() with full history
+        client = Client(url, verbose=False)
+        for message in rng.choice(scripts):
+            started = time.perf_counter()
+            first = None
+            reply = None
+            job = client.submit(message, api_name="/chat")
+            for reply in job:
+                if first is None:
+                    first = time.perf_counter() - started
+            if reply is None and job.outputs():
+                reply = job.outputs()[-1]
+            with lock:
+                records.append({"ttft": first, "latency": time.perf_counter() - started, "outcome": outcome(reply)})
+            time.sleep(rng.expovariate(1 / args.think_time) if args.think_time else 0)
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            list(pool.map(session, range(args.sessions)))
+    finally:
+        app.demo.close()
+    return records
+
+
+def summarize(records, wall, tokens):
+    ok = [record for record in records if record["outcome"] == "ok"]
+    ttfts = [record["ttft"] for record in ok if record["ttft"] is not None]
+    latencies = [record["latency"] for record in ok]
+    outcomes = {}
+    for record in records:
+        outcomes[record["outcome"]] = outcomes.get(record["outcome"], 0) + 1
+    results = {
+        "requests": len(records),
+        "outcomes": outcomes,
+        "wall_seconds": wall,
+        "requests_per_second": len(records) / wall if wall else 0.0,
+        "tokens_per_second": tokens / wall if wall else 0.0,
+    }
+    for name, values in (("ttft", ttfts), ("latency", latencies)):
+        for p in (50, 95, 99):
+            results[f"{name}_p{p}"] = percentile(values, p)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, previous=None):
+    keys = ["requests", "requests_per_second", "tokens_per_second",
+            "ttft_p50", "ttft_p95", "ttft_p99", "latency_p50", "latency_p95", "latency_p99"]
+    header = f"{'metric':<22}{'value':>12}"
+    if previous is not None:
+        header += f"{'previous':>12}{'change':>10}"
+    print(header)
+    for key in keys:
+        value = results.get(key)
+        line = f"{key:<22}{_fmt(value):>12}"
+        if previous is not None:
+            before = previous.get(key)
+            change = f"{(value - before) / before * 100:+.1f}%" if value is not None and before else "-"
+            line += f"{_fmt(before):>12}{change:>10}"
+        print(line)
+    print("outcomes:", results["outcomes"])
+
+
+def _fmt(value):
+    if value is None:
+        return "-"
+    return f"{value:.4f}" if isinstance(value, float) else str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["respond", "gradio"], default="respond")
+    parser.add_argument("--sessions", type=int, default=100, help="concurrent simulated chat sessions")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="seconds over which sessions start")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean seconds between a session's turns")
+    parser.add_argument("--conversations", default=os.path.join(os.path.dirname(__file__), "conversations.json"))
+    parser.add_argument("--gradio-port", type=int, default=7861)
+    parser.add_argument("--no-response-cache", action="store_true", help="measure every turn as a fresh generation")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    with open(args.conversations) as f:
+        scripts = json.load(f)
+
+    stubs, hf_url, cmc_url = start_stub_process(args)
+    os.environ["HF_MODEL"] = hf_url
+    os.environ["CMC_BASE_URL"] = cmc_url
+    if args.no_response_cache:
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    import app
+
+    try:
+        tokens_before = app.stream_stats.stats()["tokens_received"]
+        started = time.perf_counter()
+        if args.mode == "respond":
+            records = asyncio.run(run_respond_sessions(app, args, scripts))
+        else:
+            records = run_gradio_sessions(app, args, scripts)
+        wall = time.perf_counter() - started
+        tokens = app.stream_stats.stats()["tokens_received"] - tokens_before
+    finally:
+        stubs.terminate()
+
+    results = summarize(records, wall, tokens)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": git_revision(),
+        "config": vars(args),
+        "results": results,
+        "components": {
+            "stream": app.stream_stats.stats(),
+            "market_data": app.market_data.stats(),
+            "market_snapshot": app.market_snapshot.stats(),
+            "limiter": app.limiter.stats(),
+            "context": app.context_manager.stats(),
+            "response_cache": app.response_cache.stats() if app.response_cache is not None else None,
+        },
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+    print_results(results, previous)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Micro-benchmark for IntentRouter.route at realistic lexicon sizes.
+
+    python benchmarks/router_bench.py --sizes 100 1000 10000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import IntentRouter
+
+MESSAGES = [
+    "gm bro",
+    "what's up with the market today",
+    "$PEPE",
+    "solana price?",
+    "how much is shiba inu worth rn",
+    "ngl I went to the supermarket and forgot my wallet lmao",
+    "should I ape into some new memecoin or nah",
+    "explain impermanent loss like I'm five, also is eth still worth holding long term or am I ngmi",
+]
+
+
+def synthetic_coins(size, seed=0):
+    rng = random.Random(seed)
+    coins = [("BTC", "Bitcoin"), ("ETH", "Ethereum"), ("SOL", "Solana"), ("PEPE", "Pepe"), ("SHIB", "Shiba Inu")]
+    while len(coins) < size:
+        symbol = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(3, 6)))
+        words = rng.randint(1, 3)
+        name = " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))).title() for _ in range(words))
+        coins.append((symbol, name))
+    return coins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--number", type=int, default=20000, help="route() calls per timing run")
+    args = parser.parse_args()
+
+    print(f"{'lexicon':>8} {'build ms':>9} {'us/msg':>8}")
+    for size in args.sizes:
+        router = IntentRouter()
+        coins = synthetic_coins(size)
+        build = min(timeit.repeat(lambda: router.update_lexicon(coins), number=1, repeat=3))
+
+        def route_all():
+            for message in MESSAGES:
+                router.route(message)
+
+        runs = max(1, args.number // len(MESSAGES))
+        best = min(timeit.repeat(route_all, number=runs, repeat=5))
+        print(f"{size:>8} {build * 1e3:>9.2f} {best / (runs * len(MESSAGES)) * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
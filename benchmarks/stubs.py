@@ -0,0 +1,206 @@
+"""Local stand-ins for the Hugging Face chat-completions stream and the CoinMarketCap API.
+
+    python benchmarks/stubs.py --hf-port 8081 --cmc-port 8082 --token-delay 0.02
+
+Point the app at them with HF_MODEL=http://127.0.0.1:8081 and
+CMC_BASE_URL=http://127.0.0.1:8082; no tokens are needed.
+"""
+import argparse
+import asyncio
+import json
+import random
+import string
+import time
+
+from aiohttp import web
+
+WORDS = (
+    "bro bruh man brother ngl lfg lol lmao idk fr tho the market is looking kinda wild rn "
+    "honestly I would not ape into that without checking the chart first but you do you "
+    "solana eth btc memecoins are pumping again wagmi ngmi diamond hands paper hands dyor"
+).split()
+
+
+def add_stub_arguments(parser):
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+    parser.add_argument("--ttft-delay", type=float, default=0.15, help="seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=0.25, help="relative +/- jitter applied to every delay")
+    parser.add_argument("--tokens", type=int, default=120, help="tokens per reply before max_tokens applies")
+    parser.add_argument("--hf-error-rate", type=float, default=0.0, help="fraction of chat requests answered with an error")
+    parser.add_argument("--hf-error-status", type=int, default=500, help="HTTP status of those errors, e.g. 503 for a loading model")
+    parser.add_argument("--stop-rate", type=float, default=0.1, help="fraction of replies that drift into 'User:' mid-stream")
+    parser.add_argument("--cmc-latency", type=float, default=0.3, help="seconds per CoinMarketCap request")
+    parser.add_argument("--cmc-error-rate", type=float, default=0.0, help="fraction of CoinMarketCap requests answered with a 500")
+    parser.add_argument("--coins", type=int, default=5000, help="coins in the fake listings")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def _jittered(delay, jitter, rng):
+    return max(0.0, delay * (1 + rng.uniform(-jitter, jitter)))
+
+
+def make_hf_app(config):
+    rng = random.Random(config.seed)
+    stats = {"requests": 0, "errors": 0, "active": 0, "tokens": 0}
+
+    async def chat_completions(request):
+        body = await request.json()
+        stats["requests"] += 1
+        await asyncio.sleep(_jittered(config.ttft_delay, config.jitter, rng))
+        if rng.random() < config.hf_error_rate:
+            stats["errors"] += 1
+            return web.json_response({"error": "stub overloaded", "error_type": "overloaded"}, status=config.hf_error_status)
+
+        tokens = min(body.get("max_tokens") or config.tokens, config.tokens)
+        stop_at = rng.randrange(tokens) if rng.random() < config.stop_rate else None
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        stats["active"] += 1
+        try:
+            await response.prepare(request)
+            for i in range(tokens):
+                if i:
+                    await asyncio.sleep(_jittered(config.token_delay, config.jitter, rng))
+                text = "\n\nUser:" if i == stop_at else " " + rng.choice(WORDS)
+                chunk = {
+                    "id": "stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": "stub",
+                    "system_fingerprint": "stub",
+                    "choices": [{"index": 0, "delta": {"role": "assistant", "content": text}, "logprobs": None,
+                                 "finish_reason": "length" if i == tokens - 1 else None}],
+                }
+                await response.write(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+                stats["tokens"] += 1
+            await response.write(b"data: [DONE]\n\n")
+        except ConnectionResetError:
+            # Client cancelled the stream (stop sequence or deadline)
+            pass
+        finally:
+            stats["active"] -= 1
+        return response
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+def fake_listings(count, seed=0):
+    rng = random.Random(seed)
+    named = [("Bitcoin", "BTC"), ("Ethereum", "ETH"), ("Solana", "SOL"), ("Pepe", "PEPE"), ("Shiba Inu", "SHIB"),
+             ("Dogecoin", "DOGE"), ("Cardano", "ADA"), ("Chainlink", "LINK")]
+    coins = []
+    for rank in range(1, count + 1):
+        if rank <= len(named):
+            name, symbol = named[rank - 1]
+        else:
+            symbol = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(3, 5)))
+            name = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))).title()
+        price = 10 ** rng.uniform(-8, 4.8)
+        volume = 10 ** rng.uniform(3, 10)
+        coins.append({
+            "id": rank,
+            "name": name,
+            "symbol": symbol,
+            "slug": name.lower().replace(" ", "-"),
+            "cmc_rank": rank,
+            "last_updated": "2024-01-01T00:00:00.000Z",
+            "quote": {"USD": {
+                "price": price,
+                "volume_24h": volume,
+                "percent_change_1h": rng.gauss(0, 2),
+                "percent_change_24h": rng.gauss(0, 8),
+                "percent_change_7d": rng.gauss(0, 20),
+                "market_cap": price * 10 ** rng.uniform(6, 11),
+                "last_updated": "2024-01-01T00:00:00.000Z",
+            }},
+        })
+    return coins
+
+
+def make_cmc_app(config):
+    rng = random.Random(config.seed + 1)
+    listings = fake_listings(config.coins, config.seed)
+    by_symbol = {}
+    for coin in listings:
+        by_symbol.setdefault(coin["symbol"], []).append(coin)
+    stats = {"requests": 0, "errors": 0}
+
+    async def upstream_delay():
+        stats["requests"] += 1
+        await asyncio.sleep(_jittered(config.cmc_latency, config.jitter, rng))
+        if rng.random() < config.cmc_error_rate:
+            stats["errors"] += 1
+            raise web.HTTPInternalServerError(text='{"status": {"error_message": "stub error"}}')
+
+    async def listings_latest(request):
+        await upstream_delay()
+        start = int(request.query.get("start", 1))
+        limit = int(request.query.get("limit", 100))
+        sort = request.query.get("sort", "market_cap")
+        rows = listings
+        if sort != "market_cap":
+            descending = request.query.get("sort_dir", "desc") == "desc"
+            rows = sorted(listings, key=lambda coin: coin["quote"]["USD"].get(sort, 0), reverse=descending)
+        return web.json_response({"status": {"error_code": 0}, "data": rows[start - 1:start - 1 + limit]})
+
+    async def quotes_latest(request):
+        await upstream_delay()
+        symbols = request.query.get("symbol", "").upper().split(",")
+        return web.json_response({"status": {"error_code": 0}, "data": {s: by_symbol.get(s, []) for s in symbols}})
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get("/v1/cryptocurrency/listings/latest", listings_latest)
+    app.router.add_get("/v2/cryptocurrency/quotes/latest", quotes_latest)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+async def start_stubs(config, host="127.0.0.1", hf_port=0, cmc_port=0):
+    """Start both stubs on the running loop; returns (runners, hf_url, cmc_url)."""
+    runners, urls = [], []
+    for app, port in ((make_hf_app(config), hf_port), (make_cmc_app(config), cmc_port)):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        runners.append(runner)
+        urls.append(f"http://{host}:{site._server.sockets[0].getsockname()[1]}")
+    return runners, urls[0], urls[1]
+
+
+def serve_forever(config, host, hf_port, cmc_port, ready=None):
+    # Entry point for running the stubs in their own process, away from the load generator
+    async def main():
+        _, hf_url, cmc_url = await start_stubs(config, host, hf_port, cmc_port)
+        if ready is not None:
+            ready.put((hf_url, cmc_url))
+        else:
+            print(f"HF stub:  {hf_url}\nCMC stub: {cmc_url}", flush=True)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--hf-port", type=int, default=8081)
+    parser.add_argument("--cmc-port", type=int, default=8082)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    serve_forever(args, args.host, args.hf_port, args.cmc_port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import asyncio
+import contextlib
+
+
+class Busy(Exception):
+    pass
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight generations globally and per chat session.
+
+    Requests beyond the global limit wait in a bounded queue; once `max_queue`
+    requests are already waiting, new ones fail fast with `Busy` instead of
+    piling up behind slow generations. With a `deadline` (event-loop time), a
+    request still waiting when it passes gives up with `TimeoutError`.
+    """
+
+    def __init__(self, max_concurrent=64, per_session=2, max_queue=256):
+        self.max_concurrent = max_concurrent
+        self.per_session = per_session
+        self.max_queue = max_queue
+        self._global = asyncio.Semaphore(max_concurrent)
+        self._sessions = {}
+        self._waiting = 0
+        self._active = 0
+        self._stats = {"admitted": 0, "queued": 0, "rejected": 0, "expired": 0}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, session_id=None, deadline=None):
+        must_wait = self._global.locked() or self._session_full(session_id)
+        if must_wait and self._waiting >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise Busy("too many requests waiting")
+
+        session = self._acquire_session(session_id)
+        if must_wait:
+            self._stats["queued"] += 1
+        self._waiting += 1
+        try:
+            async with asyncio.timeout_at(deadline):
+                if session is not None:
+                    await session[0].acquire()
+                try:
+                    await self._global.acquire()
+                except BaseException:
+                    if session is not None:
+                        session[0].release()
+                    raise
+        except BaseException as e:
+            self._release_session(session_id, session)
+            if isinstance(e, TimeoutError):
+                self._stats["expired"] += 1
+            raise
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        self._stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._global.release()
+            if session is not None:
+                session[0].release()
+            self._release_session(session_id, session)
+
+    def _session_full(self, session_id):
+        session = self._sessions.get(session_id)
+        return session is not None and session[0].locked()
+
+    def _acquire_session(self, session_id):
+        if session_id is None or not self.per_session:
+            return None
+        session = self._sessions.get(session_id)
+        if session is None:
+            # [semaphore, number of requests holding or waiting on it]
+            session = self._sessions[session_id] = [asyncio.Semaphore(self.per_session), 0]
+        session[1] += 1
+        return session
+
+    def _release_session(self, session_id, session):
+        if session is None:
+            return
+        session[1] -= 1
+        if session[1] == 0:
+            del self._sessions[session_id]
+
+    def stats(self):
+        return dict(self._stats, active=self._active, waiting=self._waiting, sessions=len(self._sessions))
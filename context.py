@@ -0,0 +1,156 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+# Tokens zephyr's chat template adds around every message (<|role|>\n ... </s>\n)
+MESSAGE_OVERHEAD = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    # Llama-family tokenizers average ~4 chars/token on English; slang and emoji run denser,
+    # so err on the side of overcounting
+    return len(text) // 3 + 1
+
+
+class ContextManager:
+    """Fits chat history into a token budget before it is sent upstream.
+
+    Token counts (and summary lines) are cached per turn by content hash, so each
+    call only tokenizes turns it hasn't seen. The oldest turns are dropped until
+    the prompt plus `max_tokens` fits `context_window`; dropped turns are
+    optionally folded into a short rolling summary so Phil doesn't lose the thread.
+    """
+
+    def __init__(self, context_window=4096, count_tokens=estimate_tokens, summarize=True,
+                 summary_tokens=256, cache_size=8192):
+        self.context_window = context_window
+        self.count_tokens = count_tokens
+        self.summarize = summarize
+        self.summary_tokens = summary_tokens
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "turns_trimmed": 0,
+            "trimmed_requests": 0,
+            "over_budget_requests": 0,
+            "token_cache_hits": 0,
+            "token_cache_misses": 0,
+        }
+
+    def build(self, system_message, history, message, max_tokens):
+        """Return (messages, stats) for one request."""
+        hits = misses = 0
+
+        def measure(role, content):
+            nonlocal hits, misses
+            content = content or ""
+            key = hashlib.blake2b(f"{role}\0{content}".encode(), digest_size=16).digest()
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+            if cached is not None:
+                hits += 1
+                return cached
+            misses += 1
+            cached = (self.count_tokens(content) + MESSAGE_OVERHEAD, _gist(content))
+            with self._lock:
+                self._cache[key] = cached
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return cached
+
+        turns = []
+        for human, assistant in history:
+            user_tokens, user_gist = measure("user", human)
+            assistant_tokens, assistant_gist = measure("assistant", assistant)
+            # Avoid "User:" here: the model echoing it would trip the stop sequence
+            line = f"- they asked: {user_gist} / you said: {assistant_gist}"
+            turns.append((human, assistant, user_tokens + assistant_tokens, line))
+
+        budget = self.context_window - max_tokens
+        fixed = measure("system", system_message)[0] + measure("user", message)[0]
+
+        def fit(limit):
+            # Walk back from the newest turn, keeping whatever fits
+            used, kept = fixed, 0
+            for turn in reversed(turns):
+                if used + turn[2] > limit:
+                    break
+                used += turn[2]
+                kept += 1
+            return used, kept
+
+        used, kept = fit(budget)
+        if kept < len(turns) and self.summarize:
+            # Something has to go, so leave room for the summary of what went
+            used, kept = fit(budget - self.summary_tokens - MESSAGE_OVERHEAD)
+        evicted = turns[:len(turns) - kept]
+
+        messages = [{"role": "system", "content": system_message}]
+        if evicted and self.summarize:
+            summary = self._summary(evicted, budget - used)
+            if summary:
+                messages.append({"role": "system", "content": summary})
+                used += self.count_tokens(summary) + MESSAGE_OVERHEAD
+        for human, assistant, _, _ in turns[len(evicted):]:
+            messages.append({"role": "user", "content": human})
+            messages.append({"role": "assistant", "content": assistant})
+        messages.append({"role": "user", "content": message})
+
+        stats = {
+            "prompt_tokens": used,
+            "budget": budget,
+            "turns": len(turns),
+            "turns_kept": kept,
+            "turns_trimmed": len(evicted),
+            "over_budget": used > budget,
+            "token_cache_hits": hits,
+            "token_cache_misses": misses,
+        }
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["prompt_tokens"] += used
+            self._stats["turns_trimmed"] += len(evicted)
+            self._stats["trimmed_requests"] += int(bool(evicted))
+            self._stats["over_budget_requests"] += int(used > budget)
+            self._stats["token_cache_hits"] += hits
+            self._stats["token_cache_misses"] += misses
+        return messages, stats
+
+    def _summary(self, evicted, room):
+        # Keep the most recent evicted turns' lines that fit in both the summary cap and the leftover budget
+        limit = min(self.summary_tokens, room - MESSAGE_OVERHEAD)
+        header = "Summary of earlier conversation:"
+        used = self.count_tokens(header)
+        lines = []
+        for _, _, _, line in reversed(evicted):
+            cost = self.count_tokens(line)
+            if used + cost > limit:
+                break
+            lines.append(line)
+            used += cost
+        if not lines:
+            return ""
+        return header + "\n" + "\n".join(reversed(lines))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, cached_turns=len(self._cache))
+        stats["prompt_tokens_avg"] = stats["prompt_tokens"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+
+def _gist(content, max_chars=120):
+    # First sentence, clipped: enough to remember what was said without replaying it
+    text = " ".join(content.split())
+    text = _SENTENCE_END.split(text, 1)[0]
+    if len(text) > max_chars:
+        text = text[:max_chars - 3].rstrip() + "..."
+    return text
@@ -0,0 +1,370 @@
+import asyncio
+import json
+import re
+import statistics
+import time
+from collections import deque
+
+import aiohttp
+from huggingface_hub import ChatCompletionStreamOutput
+from huggingface_hub.constants import INFERENCE_ENDPOINT
+from huggingface_hub.utils import build_hf_headers
+
+import metrics
+
+# Upstream failures worth retrying on another backend, as long as no token has been streamed yet
+FAILOVER_ERRORS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+
+
+class UpstreamError(Exception):
+    """An error event sent in place of tokens, e.g. TGI reporting its queue is full."""
+
+    def __init__(self, message, error_type=None):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+def is_failover_error(error):
+    if isinstance(error, aiohttp.ClientResponseError):
+        # 503 included: the backend is loading or overloaded, and another one may not be
+        return error.status == 429 or error.status >= 500
+    if isinstance(error, UpstreamError):
+        return error.error_type == "overloaded"
+    return isinstance(error, FAILOVER_ERRORS)
+
+
+class NoHealthyBackend(Exception):
+    pass
+
+
+def chat_completions_url(model):
+    # Same resolution as huggingface_hub's chat_completion: endpoint URLs are used as is, model ids go to the Inference API
+    url = model if model.startswith(("http://", "https://")) else f"{INFERENCE_ENDPOINT}/models/{model}"
+    url = url.rstrip("/")
+    if url.endswith("/v1"):
+        url += "/chat/completions"
+    if not url.endswith("/chat/completions"):
+        url += "/v1/chat/completions"
+    return url
+
+
+async def _stream_chunks(response):
+    # Server-sent events in the TGI / OpenAI chat-completions format
+    async for line in response.content:
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            # Read to the end of the body so the connection can be reused
+            await response.content.read()
+            return
+        payload = json.loads(data)
+        if payload.get("error") is not None:
+            raise UpstreamError(payload["error"], payload.get("error_type"))
+        yield ChatCompletionStreamOutput.parse_obj_as_instance(payload)
+
+
+class Backend:
+    """One inference endpoint plus a rolling view of how it has been behaving.
+
+    `timeout` bounds the wait for the first token, after which the pool fails
+    over; once tokens flow the stream is only bounded by the caller's deadline.
+    Requests share one keep-alive session of up to `pool_size` connections.
+    """
+
+    def __init__(self, name, model, token=None, timeout=None, connect_timeout=10.0, pool_size=64, window=100, alpha=0.2):
+        self.name = name
+        self.model = model
+        self.token = token
+        self.url = chat_completions_url(model)
+        # The model field is informational for TGI; endpoint URLs get its conventional placeholder
+        self.model_id = "tgi" if model.startswith(("http://", "https://")) else model
+        self.headers = build_hf_headers(token=token)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+        self._session = None
+        self._session_loop = None
+        self.alpha = alpha
+        self.ttfts = deque(maxlen=window)
+        self.ttft_ewma = None
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.inflight = 0
+        self.stats = {"attempts": 0, "successes": 0, "failures": 0}
+
+    def session(self):
+        # Created lazily on the running loop; a session can't be carried over to another loop
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            # Sent directly rather than through AsyncInferenceClient, whose 503 handling
+            # retries behind a blocking time.sleep() and would stall the whole event loop.
+            # Only the connect is bounded here; the pool bounds the wait for the first token.
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout),
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def score(self, prior):
+        # Lower is better: expected time to first token, inflated by recent errors and current load.
+        # Backends without samples are assumed to be typical (`prior`), so errors still count against them.
+        ttft = self.ttft_ewma if self.ttft_ewma is not None else prior
+        return ttft * (1 + 10 * self.error_ewma) + 0.01 * self.inflight
+
+    def ttft_percentile(self, p):
+        if not self.ttfts:
+            return None
+        ordered = sorted(self.ttfts)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def observe_ttft(self, ttft):
+        self.ttfts.append(ttft)
+        self.ttft_ewma = ttft if self.ttft_ewma is None else self.ttft_ewma + self.alpha * (ttft - self.ttft_ewma)
+
+    def record_success(self, ttft):
+        self.stats["successes"] += 1
+        self.observe_ttft(ttft)
+        self.error_ewma -= self.alpha * self.error_ewma
+        self.consecutive_failures = 0
+
+    def record_failure(self, cooldown_after, cooldown):
+        self.stats["failures"] += 1
+        self.error_ewma += self.alpha * (1 - self.error_ewma)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= cooldown_after:
+            self.open_until = time.monotonic() + cooldown
+
+
+def backends_from_config(spec, default_token=None, timeout=None, pool_size=64):
+    """Build backends from INFERENCE_BACKENDS: a JSON list of {"name", "model", "token"}
+    objects, or a comma-separated list of model ids / endpoint URLs."""
+    spec = spec.strip()
+    if spec.startswith("["):
+        entries = json.loads(spec)
+    else:
+        entries = [{"model": model.strip()} for model in spec.split(",") if model.strip()]
+    backends = []
+    for index, entry in enumerate(entries):
+        backends.append(Backend(
+            name=entry.get("name") or f"backend{index}",
+            model=entry["model"],
+            token=entry.get("token") or default_token,
+            timeout=entry.get("timeout", timeout),
+            pool_size=pool_size,
+        ))
+    return backends
+
+
+class _Attempt:
+    __slots__ = ("backend", "response", "stream", "first", "started", "connected_at", "first_token_at", "closed")
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.response = None
+        self.stream = None
+        self.first = None
+        self.started = time.perf_counter()
+        self.connected_at = None
+        self.first_token_at = None
+        self.closed = False
+        backend.inflight += 1
+
+    async def open(self, messages, params):
+        backend = self.backend
+        payload = {"model": backend.model_id, "messages": messages, "stream": True}
+        payload.update((key, value) for key, value in params.items() if value is not None)
+        response = self.response = await backend.session().post(backend.url, json=payload)
+        if response.status != 200:
+            body = await response.text()
+            raise aiohttp.ClientResponseError(
+                response.request_info, response.history, status=response.status,
+                message=f"{response.reason}: {body[:200]}", headers=response.headers,
+            )
+        self.stream = _stream_chunks(response)
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.backend.inflight -= 1
+        stream, self.stream = self.stream, None
+        if stream is not None:
+            await stream.aclose()
+        # A finished response hands its connection back to the backend's pool; closing one
+        # mid-stream drops the connection instead, which tells the server to stop generating
+        if self.response is not None:
+            if self.response.content.at_eof():
+                self.response.release()
+            else:
+                self.response.close()
+
+
+class PooledStream:
+    """Async iterator over the winning attempt's chunks, starting with the one already read."""
+
+    def __init__(self, attempt):
+        self.backend = attempt.backend
+        self.connected_at = attempt.connected_at
+        self.first_token_at = attempt.first_token_at
+        self._attempt = attempt
+        self._first = attempt.first
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._first is not None:
+            first, self._first = self._first, None
+            return first
+        if self._attempt.stream is None:
+            raise StopAsyncIteration
+        return await self._attempt.stream.__anext__()
+
+    async def aclose(self):
+        await self._attempt.close()
+
+
+class InferencePool:
+    """Routes chat completions to the healthiest of several inference backends.
+
+    Backends are ranked by a rolling TTFT/error score. If a backend fails before
+    streaming its first token the next one is tried. With `hedge` on, a second
+    request goes to the runner-up once the first has waited longer than the
+    primary's `hedge_percentile` TTFT; whichever streams first wins and the other
+    is cancelled.
+    """
+
+    def __init__(self, backends, hedge=False, hedge_percentile=95, hedge_min_delay=0.25,
+                 cooldown_after=3, cooldown=30.0, default_ttft=1.0):
+        if not backends:
+            raise ValueError("InferencePool needs at least one backend")
+        self.backends = list(backends)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.cooldown_after = cooldown_after
+        self.cooldown = cooldown
+        self.default_ttft = default_ttft
+        self._stats = {"streams": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0, "exhausted": 0}
+
+    def ranked(self):
+        now = time.monotonic()
+        healthy = [backend for backend in self.backends if backend.open_until <= now]
+        sampled = [backend.ttft_ewma for backend in self.backends if backend.ttft_ewma is not None]
+        prior = statistics.median(sampled) if sampled else self.default_ttft
+        # If everything is cooling down, try them all rather than fail outright
+        return sorted(healthy or self.backends, key=lambda backend: backend.score(prior))
+
+    async def chat_completion(self, messages, **params):
+        """Open a streaming chat completion; returns a PooledStream once a backend has produced a token."""
+        candidates = self.ranked()
+        pending = {}
+        last_error = None
+        hedge = None
+
+        def launch():
+            attempt = _Attempt(candidates.pop(0))
+            pending[asyncio.ensure_future(self._first_chunk(attempt, messages, params))] = attempt
+            return attempt
+
+        try:
+            launch()
+            while pending:
+                timeout = None
+                if self.hedge and hedge is None and candidates and len(pending) == 1:
+                    timeout = self._hedge_delay(next(iter(pending.values())).backend)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Primary is slower than usual: race it against the runner-up
+                    hedge = launch()
+                    self._stats["hedges"] += 1
+                    metrics.BACKEND_ATTEMPTS.inc(hedge.backend.name, "hedged")
+                    continue
+                for task in done:
+                    attempt = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        self._stats["streams"] += 1
+                        if attempt is hedge:
+                            self._stats["hedge_wins"] += 1
+                            for primary in pending.values():
+                                self._record_lost_race(primary)
+                        metrics.BACKEND_ATTEMPTS.inc(attempt.backend.name, "won")
+                        return PooledStream(attempt)
+                    if not is_failover_error(error):
+                        raise error
+                    last_error = error
+                    attempt.backend.record_failure(self.cooldown_after, self.cooldown)
+                    metrics.BACKEND_ATTEMPTS.inc(attempt.backend.name, "failed")
+                if not pending and candidates:
+                    self._stats["failovers"] += 1
+                    launch()
+            self._stats["exhausted"] += 1
+            raise last_error or NoHealthyBackend("no inference backend available")
+        finally:
+            # Cancel and close whatever lost the race, or everything if we are bailing out
+            for task in pending:
+                task.cancel()
+            for task, attempt in pending.items():
+                try:
+                    await task
+                except BaseException:
+                    pass
+                await attempt.close()
+                metrics.BACKEND_ATTEMPTS.inc(attempt.backend.name, "cancelled")
+
+    def _hedge_delay(self, backend):
+        threshold = backend.ttft_percentile(self.hedge_percentile)
+        return max(self.hedge_min_delay, threshold or 0.0)
+
+    def _record_lost_race(self, attempt):
+        # The primary lost to its hedge: its wait so far is a lower bound on its TTFT. Only a wait
+        # longer than the current estimate says anything, and it keeps a slow backend from staying
+        # first in line. Attempts cancelled for any other reason teach us nothing.
+        backend = attempt.backend
+        waited = time.perf_counter() - attempt.started
+        if backend.ttft_ewma is None or waited > backend.ttft_ewma:
+            backend.observe_ttft(waited)
+
+    async def _first_chunk(self, attempt, messages, params):
+        backend = attempt.backend
+        backend.stats["attempts"] += 1
+        try:
+            await asyncio.wait_for(self._open(attempt, messages, params), backend.timeout)
+        except BaseException:
+            await attempt.close()
+            raise
+        backend.record_success(attempt.first_token_at - attempt.started)
+
+    async def _open(self, attempt, messages, params):
+        await attempt.open(messages, params)
+        attempt.connected_at = time.perf_counter()
+        async for chunk in attempt.stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                attempt.first = chunk
+                break
+        attempt.first_token_at = time.perf_counter()
+
+    async def aclose(self):
+        for backend in self.backends:
+            await backend.aclose()
+
+    def stats(self):
+        stats = dict(self._stats)
+        for backend in self.backends:
+            prefix = "backend_" + re.sub(r"\W", "_", backend.name) + "_"
+            stats.update({prefix + key: value for key, value in backend.stats.items()})
+            stats[prefix + "ttft_ewma"] = backend.ttft_ewma or 0.0
+            stats[prefix + "error_ewma"] = backend.error_ewma
+            stats[prefix + "inflight"] = backend.inflight
+        return stats
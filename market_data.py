@@ -0,0 +1,288 @@
+import asyncio
+import threading
+import time
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+CMC_BASE_URL = "https://pro-api.coinmarketcap.com"
+LISTINGS_PATH = "/v1/cryptocurrency/listings/latest"
+QUOTES_PATH = "/v2/cryptocurrency/quotes/latest"
+
+# Errors from either the blocking or the asyncio transport
+UPSTREAM_ERRORS = (requests.RequestException, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at", "last_used")
+
+    def __init__(self, value, fetched_at, last_used):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.last_used = last_used
+
+
+class _Call:
+    # One in-flight upstream fetch; followers wait on `done` and share the outcome
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class MarketDataProvider:
+    """Cached CoinMarketCap client shared by every chat session.
+
+    Responses are cached per (path, params) for `ttl` seconds. Concurrent misses
+    for the same key are coalesced into a single upstream request, a background
+    thread re-fetches recently used keys before they expire, and if the upstream
+    fails the last good response is served for up to `max_stale` seconds.
+
+    `get`/`listings` block on a pooled requests session; `aget`/`alistings` share
+    the same cache but fetch over aiohttp so event-loop callers never block.
+    """
+
+    def __init__(self, api_key, base_url=CMC_BASE_URL, ttl=60.0, refresh_interval=30.0,
+                 max_stale=900.0, idle_timeout=600.0, timeout=10.0, pool_size=10):
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.max_stale = max_stale
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        # Keep-alive connection pool so repeat calls skip the TCP/TLS handshake
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"X-CMC_PRO_API_KEY": api_key, "Accept": "application/json"})
+
+        self._headers = dict(self.session.headers)
+        self._async_session = None
+
+        self._cache = {}
+        self._inflight = {}
+        self._ainflight = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+        self._stats = {
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "stale_served": 0,
+            "coalesced": 0,
+            "upstream_requests": 0,
+            "upstream_errors": 0,
+            "upstream_latency_total": 0.0,
+            "upstream_latency_max": 0.0,
+        }
+
+    def listings(self, start=1, limit=100, sort="market_cap", convert="USD"):
+        params = {"start": str(start), "limit": str(limit), "sort": sort, "convert": convert}
+        return self.get(LISTINGS_PATH, params)["data"]
+
+    async def alistings(self, start=1, limit=100, sort="market_cap", convert="USD", sort_dir="desc"):
+        params = {"start": str(start), "limit": str(limit), "sort": sort, "convert": convert}
+        if sort_dir != "desc":
+            params["sort_dir"] = sort_dir
+        return (await self.aget(LISTINGS_PATH, params))["data"]
+
+    async def aquote(self, symbol, convert="USD"):
+        # v2 returns every coin sharing the symbol, highest ranked first
+        data = (await self.aget(QUOTES_PATH, {"symbol": symbol, "convert": convert}))["data"]
+        matches = data.get(symbol) or []
+        return matches[0] if matches else None
+
+    def get(self, path, params=None):
+        key, value, entry = self._lookup(path, params)
+        if value is not None:
+            return value
+        try:
+            return self._fetch(key)
+        except requests.RequestException:
+            return self._stale(entry)
+
+    def fetch(self, path, params=None):
+        # Uncached request over the pooled session, for callers that manage their own freshness
+        return self._request(path, tuple(sorted((params or {}).items())))
+
+    async def aget(self, path, params=None):
+        key, value, entry = self._lookup(path, params)
+        if value is not None:
+            return value
+        try:
+            return await self._afetch(key)
+        except UPSTREAM_ERRORS:
+            return self._stale(entry)
+
+    def _lookup(self, path, params):
+        key = (path, tuple(sorted((params or {}).items())))
+        if self.refresh_interval and self._refresher is None:
+            self.start()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                entry.last_used = now
+                if now - entry.fetched_at < self.ttl:
+                    self._stats["cache_hits"] += 1
+                    return key, entry.value, entry
+            self._stats["cache_misses"] += 1
+        return key, None, entry
+
+    def _stale(self, entry):
+        # Stale-while-revalidate: a recent snapshot beats an error reply; called from an except block
+        if entry is None or time.monotonic() - entry.fetched_at > self.max_stale:
+            raise
+        with self._lock:
+            self._stats["stale_served"] += 1
+        return entry.value
+
+    def _store(self, key, value):
+        # Caller holds self._lock
+        now = time.monotonic()
+        previous = self._cache.get(key)
+        last_used = previous.last_used if previous is not None else now
+        self._cache[key] = _Entry(value, now, last_used)
+
+    def _fetch(self, key):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._request(*key)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if call.error is None:
+                    self._store(key, call.value)
+            call.done.set()
+        return call.value
+
+    async def _afetch(self, key):
+        task = self._ainflight.get(key)
+        if task is None:
+            task = self._ainflight[key] = asyncio.ensure_future(self._arequest(*key))
+            task.add_done_callback(lambda task: self._afetch_done(key, task))
+        else:
+            with self._lock:
+                self._stats["coalesced"] += 1
+        # Shielded so a caller hitting its deadline doesn't cancel the fetch others are waiting on
+        return await asyncio.shield(task)
+
+    def _afetch_done(self, key, task):
+        del self._ainflight[key]
+        # exception() also marks a failure as retrieved when nobody is left awaiting it
+        if not task.cancelled() and task.exception() is None:
+            with self._lock:
+                self._store(key, task.result())
+
+    def _request(self, path, params):
+        started = time.perf_counter()
+        try:
+            response = self.session.get(self.base_url + path, params=dict(params), timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except requests.RequestException:
+            with self._lock:
+                self._stats["upstream_errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._stats["upstream_requests"] += 1
+                self._stats["upstream_latency_total"] += elapsed
+                self._stats["upstream_latency_max"] = max(self._stats["upstream_latency_max"], elapsed)
+
+    async def _arequest(self, path, params):
+        if self._async_session is None or self._async_session.closed:
+            self._async_session = aiohttp.ClientSession(
+                headers=self._headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit_per_host=self.pool_size),
+            )
+        started = time.perf_counter()
+        try:
+            async with self._async_session.get(self.base_url + path, params=dict(params)) as response:
+                response.raise_for_status()
+                return await response.json()
+        except UPSTREAM_ERRORS:
+            with self._lock:
+                self._stats["upstream_errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._stats["upstream_requests"] += 1
+                self._stats["upstream_latency_total"] += elapsed
+                self._stats["upstream_latency_max"] = max(self._stats["upstream_latency_max"], elapsed)
+
+    async def aclose(self):
+        if self._async_session is not None:
+            await self._async_session.close()
+            self._async_session = None
+
+    def start(self):
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._stop.clear()
+            self._refresher = threading.Thread(target=self._refresh_loop, name="market-data-refresher", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+        refresher = self._refresher
+        if refresher is not None:
+            refresher.join()
+        self._refresher = None
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            now = time.monotonic()
+            with self._lock:
+                # Drop keys nobody has asked for in a while once they are too old to serve
+                for key, entry in list(self._cache.items()):
+                    if now - entry.last_used > self.idle_timeout and now - entry.fetched_at > self.max_stale:
+                        del self._cache[key]
+                # Re-fetch keys still in use that would expire before the next tick
+                due = [
+                    key for key, entry in self._cache.items()
+                    if now - entry.last_used <= self.idle_timeout
+                    and now - entry.fetched_at >= self.ttl - self.refresh_interval
+                ]
+            for key in due:
+                try:
+                    self._fetch(key)
+                except requests.RequestException:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cache_entries"] = len(self._cache)
+        lookups = stats["cache_hits"] + stats["cache_misses"]
+        stats["hit_ratio"] = stats["cache_hits"] / lookups if lookups else 0.0
+        requests_made = stats["upstream_requests"]
+        stats["upstream_latency_avg"] = stats["upstream_latency_total"] / requests_made if requests_made else 0.0
+        return stats
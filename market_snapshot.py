@@ -0,0 +1,256 @@
+import threading
+import time
+
+import numpy as np
+import requests
+
+from market_data import LISTINGS_PATH
+
+# Quote fields kept as float64 columns; anything CMC leaves null becomes NaN
+FIELDS = ("price", "volume_24h", "market_cap", "percent_change_1h", "percent_change_24h", "percent_change_7d")
+
+
+class _Table:
+    # Immutable once published; refreshes build a new table and swap the reference
+    __slots__ = ("ids", "ranks", "names", "symbols", "seen", "columns", "by_id", "by_symbol")
+
+    def __init__(self, ids, ranks, names, symbols, seen, columns):
+        self.ids = ids
+        self.ranks = ranks
+        self.names = names
+        self.symbols = symbols
+        # Sweep in which each row was last returned by CMC
+        self.seen = seen
+        self.columns = columns
+        self.by_id = {coin_id: row for row, coin_id in enumerate(ids.tolist())}
+        self.by_symbol = {}
+        # Several coins can share a ticker; the best ranked one owns it
+        for row in np.argsort(ranks, kind="stable").tolist():
+            self.by_symbol.setdefault(symbols[row].upper(), row)
+
+
+def _table_from_listings(listings, convert, sweep):
+    count = len(listings)
+    ids = np.fromiter((coin["id"] for coin in listings), dtype=np.int64, count=count)
+    ranks = np.fromiter((coin.get("cmc_rank") or np.iinfo(np.int32).max for coin in listings), dtype=np.int64, count=count)
+    names = np.array([coin["name"] for coin in listings], dtype=object)
+    symbols = np.array([coin["symbol"] for coin in listings], dtype=object)
+    columns = {}
+    for field in FIELDS:
+        columns[field] = np.fromiter(
+            (np.nan if (value := coin["quote"][convert].get(field)) is None else value for coin in listings),
+            dtype=np.float64,
+            count=count,
+        )
+    return _Table(ids, ranks, names, symbols, np.full(count, sweep, dtype=np.int64), columns)
+
+
+class MarketSnapshot:
+    """Column-oriented copy of the CoinMarketCap listings, queried locally.
+
+    The full listing is bulk-loaded once into one NumPy array per quote field
+    plus a symbol -> row index. After that a background thread re-fetches one
+    page per `refresh_interval`, round-robin, and merges it in, so every coin
+    is refreshed once per sweep without re-downloading the whole market. Coins
+    that go two whole sweeps without showing up have dropped out of the top
+    `size` and are removed; one missed sweep can just mean the coin changed
+    pages between fetches. Queries read whatever table is current; updates
+    never mutate it in place.
+    """
+
+    def __init__(self, provider, size=5000, page_size=1000, refresh_interval=60.0, retry_interval=30.0, convert="USD"):
+        self.provider = provider
+        self.size = size
+        self.page_size = min(page_size, size)
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.convert = convert
+        self._table = None
+        # Bumped whenever coins are added, so the router only rebuilds its lexicon when it has to
+        self.membership_version = 0
+        self._next_start = 1
+        self._sweep = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+        self._stats = {
+            "loads": 0, "page_refreshes": 0, "sweeps": 0, "refresh_errors": 0, "coins": 0, "dropped": 0, "last_refresh": 0.0,
+        }
+
+    @property
+    def loaded(self):
+        return self._table is not None
+
+    def _fetch_page(self, start, limit):
+        params = {"start": str(start), "limit": str(limit), "sort": "market_cap", "convert": self.convert}
+        return self.provider.fetch(LISTINGS_PATH, params)["data"]
+
+    def load(self):
+        listings = []
+        for start in range(1, self.size + 1, self.page_size):
+            page = self._fetch_page(start, min(self.page_size, self.size - start + 1))
+            listings.extend(page)
+            if len(page) < self.page_size:
+                break
+        with self._lock:
+            self._table = _table_from_listings(listings, self.convert, self._sweep)
+            # The bulk load counts as a sweep; the first round-robin pass starts a new one
+            self._sweep += 1
+            self._next_start = 1
+            self.membership_version += 1
+            self._stats["loads"] += 1
+            self._stats["coins"] = len(listings)
+            self._stats["last_refresh"] = time.time()
+
+    def refresh_page(self):
+        start = self._next_start
+        page = self._fetch_page(start, min(self.page_size, self.size - start + 1))
+        self.merge(page)
+        if start + self.page_size <= self.size and len(page) == self.page_size:
+            self._next_start = start + self.page_size
+        else:
+            self._next_start = 1
+            self._end_sweep()
+
+    def merge(self, listings):
+        if not listings:
+            return
+        with self._lock:
+            table = self._table
+            update = _table_from_listings(listings, self.convert, self._sweep)
+            rows = np.fromiter((table.by_id.get(coin_id, -1) for coin_id in update.ids.tolist()), dtype=np.int64, count=len(update.ids))
+            known = rows >= 0
+            new = ~known
+
+            columns = {}
+            for field in FIELDS:
+                column = table.columns[field].copy()
+                column[rows[known]] = update.columns[field][known]
+                columns[field] = np.concatenate((column, update.columns[field][new]))
+            ranks = table.ranks.copy()
+            ranks[rows[known]] = update.ranks[known]
+            names = table.names.copy()
+            names[rows[known]] = update.names[known]
+            symbols = table.symbols.copy()
+            symbols[rows[known]] = update.symbols[known]
+            seen = table.seen.copy()
+            seen[rows[known]] = self._sweep
+
+            self._table = _Table(
+                np.concatenate((table.ids, update.ids[new])),
+                np.concatenate((ranks, update.ranks[new])),
+                np.concatenate((names, update.names[new])),
+                np.concatenate((symbols, update.symbols[new])),
+                np.concatenate((seen, update.seen[new])),
+                columns,
+            )
+            if new.any():
+                self.membership_version += 1
+            self._stats["page_refreshes"] += 1
+            self._stats["coins"] = len(self._table.ids)
+            self._stats["last_refresh"] = time.time()
+
+    def _end_sweep(self):
+        # Pages are fetched minutes apart, so a coin that climbs into a page already fetched
+        # this sweep (or falls into one already passed) is missed once without leaving the
+        # top `size`. Only a coin missing for this sweep and the one before is gone.
+        with self._lock:
+            table = self._table
+            keep = table.seen >= self._sweep - 1
+            dropped = len(keep) - int(keep.sum())
+            if dropped:
+                self._table = _Table(
+                    table.ids[keep], table.ranks[keep], table.names[keep], table.symbols[keep], table.seen[keep],
+                    {field: column[keep] for field, column in table.columns.items()},
+                )
+                self.membership_version += 1
+                self._stats["dropped"] += dropped
+                self._stats["coins"] = len(self._table.ids)
+            self._sweep += 1
+            self._stats["sweeps"] += 1
+
+    def top(self, field, k=10, ascending=False, min_volume=None, min_market_cap=None):
+        """The k best rows by `field` (largest first unless `ascending`), skipping NaNs and filtered rows."""
+        self._ensure_started()
+        table = self._table
+        if table is None:
+            return None
+        values = table.columns[field]
+        keep = ~np.isnan(values)
+        if min_volume is not None:
+            keep &= table.columns["volume_24h"] >= min_volume
+        if min_market_cap is not None:
+            keep &= table.columns["market_cap"] >= min_market_cap
+        candidates = np.flatnonzero(keep)
+        if len(candidates) == 0:
+            return []
+        keys = values[candidates] if ascending else -values[candidates]
+        k = min(k, len(candidates))
+        best = np.argpartition(keys, k - 1)[:k]
+        best = best[np.argsort(keys[best], kind="stable")]
+        return [self._row(table, row) for row in candidates[best].tolist()]
+
+    def quote(self, symbol):
+        self._ensure_started()
+        table = self._table
+        if table is None:
+            return None
+        row = table.by_symbol.get(symbol.upper())
+        return None if row is None else self._row(table, row)
+
+    def coins(self):
+        """(symbol, name) pairs in rank order, for building lookup lexicons."""
+        self._ensure_started()
+        table = self._table
+        if table is None:
+            return []
+        order = np.argsort(table.ranks, kind="stable")
+        return list(zip(table.symbols[order].tolist(), table.names[order].tolist()))
+
+    def _row(self, table, row):
+        coin = {"name": table.names[row], "symbol": table.symbols[row], "cmc_rank": int(table.ranks[row])}
+        for field in FIELDS:
+            coin[field] = float(table.columns[field][row])
+        return coin
+
+    def _ensure_started(self):
+        # With refreshing off the thread only does the initial load
+        if self._refresher is None and (self._table is None or self.refresh_interval):
+            self.start()
+
+    def start(self):
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._stop.clear()
+            self._refresher = threading.Thread(target=self._refresh_loop, name="market-snapshot-refresher", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+        refresher = self._refresher
+        if refresher is not None:
+            refresher.join()
+        self._refresher = None
+
+    def _refresh_loop(self):
+        delay = 0.0
+        while not self._stop.wait(delay):
+            try:
+                if self._table is None:
+                    self.load()
+                elif self.refresh_interval:
+                    self.refresh_page()
+                if not self.refresh_interval:
+                    return
+                delay = self.refresh_interval
+            except (requests.RequestException, KeyError, ValueError):
+                with self._lock:
+                    self._stats["refresh_errors"] += 1
+                delay = self.retry_interval if self._table is None else self.refresh_interval
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["loaded"] = self.loaded
+        return stats
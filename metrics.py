@@ -0,0 +1,166 @@
+import bisect
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans from sub-millisecond routing up to slow full generations
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TURN_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            metric.render(lines)
+        lines.append("")
+        return "\n".join(lines)
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} counter")
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labelvalues -> [per-bucket counts (last is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        with self._lock:
+            series = [(labelvalues, list(counts), total, count) for labelvalues, (counts, total, count) in self._series.items()]
+        for labelvalues, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {count}")
+
+
+class StatsCollector:
+    # Exposes a component's stats() dict as one untyped sample per numeric key at scrape time
+    def __init__(self, prefix, stats, registry=None):
+        self.prefix = prefix
+        self.stats = stats
+        if registry is not None:
+            registry.register(self)
+
+    def render(self, lines):
+        stats = self.stats()
+        if stats is None:
+            return
+        for key, value in stats.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                name = f"{self.prefix}_{key}"
+                lines.append(f"# TYPE {name} untyped")
+                lines.append(f"{name} {_number(value)}")
+
+
+REGISTRY = Registry()
+
+REQUESTS = Counter("phillip_requests_total", "Chat requests by route and outcome.", ("route", "outcome"), registry=REGISTRY)
+ERRORS = Counter("phillip_errors_total", "Errors by stage and exception type.", ("stage", "type"), registry=REGISTRY)
+STAGE_SECONDS = Histogram(
+    "phillip_stage_seconds",
+    "Time spent in each stage of the chat pipeline.",
+    ("stage",),
+    registry=REGISTRY,
+)
+REQUEST_SECONDS = Histogram(
+    "phillip_request_seconds", "End-to-end reply time by route.", ("route",), registry=REGISTRY
+)
+TTFT_SECONDS = Histogram(
+    "phillip_time_to_first_token_seconds", "Time from sending the prompt to the first streamed token.", registry=REGISTRY
+)
+PROMPT_TOKENS = Histogram(
+    "phillip_prompt_tokens", "Estimated prompt tokens sent upstream.", buckets=TOKEN_BUCKETS, registry=REGISTRY
+)
+CONTEXT_TURNS_TRIMMED = Histogram(
+    "phillip_context_turns_trimmed", "History turns trimmed to fit the context window, per request.", buckets=TURN_BUCKETS, registry=REGISTRY
+)
+CONTEXT_OVER_BUDGET = Counter(
+    "phillip_context_over_budget_total", "Requests whose prompt still exceeded the token budget after trimming.", registry=REGISTRY
+)
+BACKEND_ATTEMPTS = Counter(
+    "phillip_backend_attempts_total",
+    "Inference attempts by backend and result (won, failed, hedged, cancelled).",
+    ("backend", "result"),
+    registry=REGISTRY,
+)
+COMPLETION_TOKENS = Histogram(
+    "phillip_completion_tokens", "Tokens streamed back per generation.", buckets=TOKEN_BUCKETS, registry=REGISTRY
+)
+
+
+def stage_done(stage, started):
+    """Record the stage that began at `started` and return now, the start of the next one."""
+    now = time.perf_counter()
+    STAGE_SECONDS.observe(now - started, stage)
+    return now
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import math
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_PUNCTUATION = re.compile(r"[^\w\s$]")
+
+
+def normalize_message(message):
+    # "GM!!", "gm" and " gm " are the same opener
+    return " ".join(_PUNCTUATION.sub("", message.lower()).split())
+
+
+def variants_for_temperature(temperature, max_variants=4):
+    """How many sampled replies to collect for a key before serving it from cache.
+
+    Near-greedy sampling gives the same answer anyway, so one reply is enough;
+    hotter sampling needs a few to pick from or repeats start to look canned.
+    """
+    if temperature <= 0.3:
+        return 1
+    return max(1, min(max_variants, math.ceil(temperature * max_variants / 2)))
+
+
+class _Entry:
+    __slots__ = ("variants", "created_at", "latency")
+
+    def __init__(self, variants, created_at, latency):
+        self.variants = variants
+        self.created_at = created_at
+        self.latency = latency
+
+
+class ResponseCache:
+    """LRU + TTL cache of finished LLM replies, keyed on everything that shapes them.
+
+    A key holds up to `max_variants` replies. `policy(temperature)` says how many
+    must be collected before the key is served from cache; until then lookups miss
+    and the fresh generation is added as another variant. With `path` set, entries
+    are persisted to SQLite and reloaded on start so restarts stay warm. Writes go
+    through a queue to a background thread that commits them in batches, so
+    get/put never wait on the disk.
+    """
+
+    def __init__(self, max_entries=2048, ttl=3600.0, max_variants=4, context_turns=1,
+                 path=None, policy=variants_for_temperature, write_batch=256, write_queue=10000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_variants = max_variants
+        self.context_turns = context_turns
+        self.policy = policy
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = None
+        self._writer = None
+        self.write_batch = write_batch
+        self._stats = {
+            "hits": 0, "misses": 0, "stores": 0, "evictions": 0, "saved_latency_total": 0.0,
+            "db_commits": 0, "db_errors": 0, "db_dropped": 0,
+        }
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, variants TEXT, created_at REAL, latency REAL)"
+            )
+            self._load()
+            self._writes = queue.Queue(maxsize=write_queue)
+            self._writer = threading.Thread(target=self._write_loop, name="response-cache-writer", daemon=True)
+            self._writer.start()
+
+    def key(self, message, system_message, history, max_tokens, temperature, top_p):
+        recent = history[-self.context_turns:] if self.context_turns else []
+        material = json.dumps(
+            [normalize_message(message), system_message, recent, max_tokens, round(temperature, 1), round(top_p, 2)]
+        )
+        return hashlib.blake2b(material.encode(), digest_size=16).hexdigest()
+
+    def get(self, key, temperature):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at > self.ttl:
+                self._evict(key)
+                entry = None
+            if entry is None or len(entry.variants) < self.policy(temperature, self.max_variants):
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            self._stats["saved_latency_total"] += entry.latency
+            return random.choice(entry.variants)
+
+    def put(self, key, response, latency):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry.created_at > self.ttl:
+                entry = self._entries[key] = _Entry([], now, latency)
+            # Repeats are kept: sampling from the list then mirrors how often the model says each reply
+            entry.variants.append(response)
+            del entry.variants[:-self.max_variants]
+            # Running mean of what a generation for this key costs, i.e. what a hit saves
+            entry.latency += (latency - entry.latency) / len(entry.variants)
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+            self._persist((key, list(entry.variants), entry.created_at, entry.latency))
+
+    def _evict(self, key):
+        # Caller holds self._lock
+        del self._entries[key]
+        self._stats["evictions"] += 1
+        self._persist((key, None, None, None))
+
+    def _persist(self, row):
+        # Caller holds self._lock; a row with variants None deletes the key
+        if self._writes is None:
+            return
+        try:
+            self._writes.put_nowait(row)
+        except queue.Full:
+            # The disk can't keep up; losing persistence beats stalling replies
+            self._stats["db_dropped"] += 1
+
+    def _write_loop(self):
+        while True:
+            rows = [self._writes.get()]
+            while len(rows) < self.write_batch:
+                try:
+                    rows.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._db.execute("BEGIN")
+                for key, variants, created_at, latency in rows:
+                    if variants is None:
+                        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    else:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                            (key, json.dumps(variants), created_at, latency),
+                        )
+                self._db.execute("COMMIT")
+                with self._lock:
+                    self._stats["db_commits"] += 1
+            except sqlite3.Error:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                with self._lock:
+                    self._stats["db_errors"] += 1
+            finally:
+                for _ in rows:
+                    self._writes.task_done()
+
+    def flush(self):
+        """Block until every queued write has been committed."""
+        if self._writes is not None:
+            self._writes.join()
+
+    def _load(self):
+        cutoff = time.time() - self.ttl
+        self._db.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+        rows = self._db.execute(
+            "SELECT key, variants, created_at, latency FROM responses ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for key, variants, created_at, latency in reversed(rows):
+            self._entries[key] = _Entry(json.loads(variants), created_at, latency)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        stats["db_pending"] = self._writes.qsize() if self._writes is not None else 0
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
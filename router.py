@@ -0,0 +1,165 @@
+import re
+import threading
+import time
+from typing import NamedTuple
+
+TOP_MOVERS = "top_movers"
+QUOTE = "quote"
+LLM = "llm"
+
+_COIN = "coin"
+_MODIFIER = "modifier"
+_WEAK_MOVER = "weak_mover"
+
+# Phrases that ask about the market as a whole
+MOVER_PHRASES = (
+    "pump", "pumping", "pumps", "memecoin", "memecoins", "top movers", "movers", "gainers", "mooning",
+    "losers", "dumping", "tanking", "top volume",
+)
+# Too common on their own ("what coin should I learn about"); they only ask for movers next to a ranking word
+WEAK_MOVER_PHRASES = ("coin", "coins", "market", "markets", "ticker", "tickers")
+RANKING_WORDS = ("top", "best", "biggest", "hottest")
+# Words that pick which ranking a market question wants; the default is 1h gainers
+RANKING_MODIFIERS = {
+    "1h": ("field", "percent_change_1h"),
+    "hour": ("field", "percent_change_1h"),
+    "24h": ("field", "percent_change_24h"),
+    "today": ("field", "percent_change_24h"),
+    "daily": ("field", "percent_change_24h"),
+    "7d": ("field", "percent_change_7d"),
+    "week": ("field", "percent_change_7d"),
+    "weekly": ("field", "percent_change_7d"),
+    "volume": ("field", "volume_24h"),
+    "losers": ("ascending", True),
+    "dumping": ("ascending", True),
+    "tanking": ("ascending", True),
+    "worst": ("ascending", True),
+}
+# Phrases that turn a nearby coin mention into a price lookup
+QUOTE_CUES = ("price", "prices", "quote", "worth", "trading at", "how much", "chart", "mcap", "market cap")
+# Most words allowed between a quote cue and the coin it applies to
+QUOTE_WINDOW = 3
+# Coins this high in the ranking are recognized by bare lowercase name or symbol ("solana", "eth");
+# the rest need a $TICKER, an uppercase ticker or their full multi-word name
+WELL_KNOWN_COINS = 100
+# Everyday words and acronyms that are also coin names or tickers; only a $TICKER makes them a coin
+AMBIGUOUS_SYMBOLS = frozenset(
+    "a ai all am an and any are as at be best big bro but buy by can coin do for gm go good got "
+    "hi how i if in is it just let lol love me moon my new no not now of ok on one or out pay "
+    "people real sell so the this to up us we wen what why win yes you "
+    "near flow render maker stacks optimism".split()
+)
+
+_TOKENS = re.compile(r"\$?[A-Za-z0-9]+(?:[.\-][A-Za-z0-9]+)*")
+
+
+class Route(NamedTuple):
+    handler: str
+    symbol: str = None
+    field: str = "percent_change_1h"
+    ascending: bool = False
+
+
+class IntentRouter:
+    """Routes a chat message to top movers, a single-coin quote or the LLM in one pass.
+
+    The message is tokenized once on word boundaries; each token and the n-grams
+    ending at it are looked up in a single phrase table holding mover phrases,
+    quote cues and the coin symbol/name lexicon, so routing cost depends on the
+    message length rather than on how many coins are listed. A quote needs a cue
+    within `QUOTE_WINDOW` words of a coin mention.
+    """
+
+    def __init__(self, mover_phrases=MOVER_PHRASES, quote_cues=QUOTE_CUES, modifiers=RANKING_MODIFIERS,
+                 well_known=WELL_KNOWN_COINS):
+        self.well_known = well_known
+        self._static = {}
+        for phrase in RANKING_WORDS:
+            self._static[phrase] = (_MODIFIER, None)
+        for phrase, modifier in modifiers.items():
+            self._static[phrase] = (_MODIFIER, modifier)
+        for phrase in WEAK_MOVER_PHRASES:
+            self._static[phrase] = (_WEAK_MOVER, None)
+        for phrase in mover_phrases:
+            self._static[phrase] = (TOP_MOVERS, modifiers.get(phrase))
+        for phrase in quote_cues:
+            self._static[phrase] = (QUOTE, None)
+        self._lock = threading.Lock()
+        self._phrases = dict(self._static)
+        self._max_words = max(len(phrase.split()) for phrase in self._phrases)
+        self.lexicon_size = 0
+        self.lexicon_updated = None
+
+    def update_lexicon(self, coins):
+        # (symbol, name) pairs arrive ranked by market cap; the first coin to claim a symbol or name keeps it
+        phrases = dict(self._static)
+        count = 0
+        for rank, (symbol, name) in enumerate(coins):
+            well_known = rank < self.well_known
+            symbol_alias = symbol.lower()
+            for alias in (symbol_alias, " ".join(_TOKENS.findall(name.lower()))):
+                if alias and alias not in phrases:
+                    phrases[alias] = (_COIN, (symbol, well_known, alias == symbol_alias))
+            count += 1
+        max_words = max(len(phrase.split()) for phrase in phrases)
+        with self._lock:
+            self._phrases = phrases
+            self._max_words = max_words
+            self.lexicon_size = count
+            self.lexicon_updated = time.monotonic()
+
+    def route(self, message):
+        phrases = self._phrases
+        max_words = self._max_words
+        originals = _TOKENS.findall(message)
+        tokens = [token.lower() for token in originals]
+
+        movers = weak_movers = ranked = False
+        ranking = {}
+        cues = []
+        coins = []
+        for i, token in enumerate(tokens):
+            if token[0] == "$":
+                if token[1].isdigit():
+                    # "$100" is an amount, not a ticker
+                    continue
+                # A cashtag is an explicit ask, known coin or not
+                return Route(QUOTE, token[1:].upper())
+            words = token
+            for n in range(1, min(max_words, i + 1) + 1):
+                if n > 1:
+                    words = tokens[i - n + 1] + " " + words
+                match = phrases.get(words)
+                if match is None:
+                    continue
+                kind, value = match
+                if kind == TOP_MOVERS:
+                    movers = True
+                    if value is not None:
+                        ranking[value[0]] = value[1]
+                elif kind == _WEAK_MOVER:
+                    weak_movers = True
+                elif kind == _MODIFIER:
+                    ranked = True
+                    if value is not None:
+                        ranking[value[0]] = value[1]
+                elif kind == QUOTE:
+                    cues.append((i - n + 1, i))
+                elif n > 1 or self._bare_coin(words, originals[i], value):
+                    coins.append((value[0], i - n + 1, i))
+
+        for symbol, first, last in coins:
+            for cue_first, cue_last in cues:
+                if max(first, cue_first) - min(last, cue_last) - 1 <= QUOTE_WINDOW:
+                    return Route(QUOTE, symbol)
+        if movers or (weak_movers and ranked):
+            return Route(TOP_MOVERS, **ranking)
+        return Route(LLM)
+
+    @staticmethod
+    def _bare_coin(word, original, coin):
+        # A single word only counts as a coin if it can't just as well be English
+        _, well_known, is_symbol = coin
+        if word in AMBIGUOUS_SYMBOLS:
+            return False
+        return well_known or (is_symbol and len(original) > 1 and original.isupper())
@@ -0,0 +1,84 @@
+import threading
+
+# Markers zephyr emits when it starts writing the user's side of the conversation
+STOP_SEQUENCES = ("<|user|>", "User:")
+
+
+class StopSequenceMatcher:
+    """Incrementally scans streamed text for stop sequences.
+
+    Text that could be the start of a stop sequence split across chunks is held
+    back until the next chunk decides it, so nothing after a stop sequence is
+    ever released.
+    """
+
+    def __init__(self, stop_sequences=STOP_SEQUENCES):
+        self.stop_sequences = tuple(stop_sequences)
+        self._holdback = max(len(s) for s in self.stop_sequences) - 1
+        self._pending = ""
+        self.stopped = False
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def feed(self, text):
+        if self.stopped:
+            return ""
+        buffer = self._pending + text
+
+        cut = -1
+        for stop in self.stop_sequences:
+            index = buffer.find(stop)
+            if index != -1 and (cut == -1 or index < cut):
+                cut = index
+        if cut != -1:
+            self.stopped = True
+            self._pending = ""
+            return buffer[:cut]
+
+        # Hold back the longest suffix that is still a prefix of a stop sequence
+        keep = 0
+        for n in range(min(self._holdback, len(buffer)), 0, -1):
+            suffix = buffer[-n:]
+            if any(stop.startswith(suffix) for stop in self.stop_sequences):
+                keep = n
+                break
+        self._pending = buffer[len(buffer) - keep:]
+        return buffer[:len(buffer) - keep]
+
+    def flush(self):
+        text, self._pending = self._pending, ""
+        return text
+
+
+class StreamStats:
+    # Running totals for streamed generations: time-to-first-token and tokens thrown away
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "streams": 0,
+            "early_stops": 0,
+            "tokens_received": 0,
+            "tokens_wasted": 0,
+            "ttft_count": 0,
+            "ttft_total": 0.0,
+            "ttft_max": 0.0,
+        }
+
+    def record(self, ttft, tokens_received, tokens_wasted, stopped):
+        with self._lock:
+            self._stats["streams"] += 1
+            self._stats["early_stops"] += int(stopped)
+            self._stats["tokens_received"] += tokens_received
+            self._stats["tokens_wasted"] += tokens_wasted
+            if ttft is not None:
+                self._stats["ttft_count"] += 1
+                self._stats["ttft_total"] += ttft
+                self._stats["ttft_max"] = max(self._stats["ttft_max"], ttft)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["ttft_avg"] = stats["ttft_total"] / stats["ttft_count"] if stats["ttft_count"] else 0.0
+        return stats
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import importlib
+import os
+import sys
+import threading
+
+import pytest
+import requests
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stubs import add_stub_arguments, make_cmc_app, make_hf_app
+
+
+def stub_config(**overrides):
+    """Stub settings as the benchmarks parse them, minus jitter so timings are predictable."""
+    parser = argparse.ArgumentParser()
+    add_stub_arguments(parser)
+    config = parser.parse_args([])
+    config.jitter = 0.0
+    vars(config).update(overrides)
+    return config
+
+
+class StubServer:
+    # Runs an aiohttp app on its own loop thread so blocking and asyncio clients can both reach it
+    def __init__(self, app):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.runner = web.AppRunner(app, access_log=None)
+        self.url = asyncio.run_coroutine_threadsafe(self._start(), self.loop).result(10)
+
+    async def _start(self):
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    def stats(self):
+        return requests.get(self.url + "/stats", timeout=5).json()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(app):
+        server = StubServer(app)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture(scope="session")
+def app():
+    # app.py reads its config at import time, so it is imported once, pointed at one pair of stubs
+    config = stub_config(ttft_delay=0.05, token_delay=0.02, tokens=20, stop_rate=0.0, cmc_latency=0.05, coins=50)
+    servers = [StubServer(make_hf_app(config)), StubServer(make_cmc_app(config))]
+    os.environ.update({
+        "HF_MODEL": servers[0].url,
+        "CMC_BASE_URL": servers[1].url,
+        "RESPONSE_CACHE_SIZE": "0",
+        "MARKET_SNAPSHOT_SIZE": "50",
+    })
+    app = importlib.import_module("app")
+    app.config = config
+    yield app
+    for server in servers:
+        server.close()
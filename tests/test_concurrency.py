@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from concurrency import Busy, ConcurrencyLimiter
+
+
+async def hold(limiter, session_id, entered, release):
+    async with limiter.slot(session_id):
+        entered.set()
+        await release.wait()
+
+
+def test_full_queue_raises_busy():
+    async def main():
+        limiter = ConcurrencyLimiter(max_concurrent=1, per_session=0, max_queue=1)
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(limiter, "a", entered, release))
+        await entered.wait()
+        waiter = asyncio.create_task(hold(limiter, "b", asyncio.Event(), release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(Busy):
+            async with limiter.slot("c"):
+                pass
+        assert limiter.stats()["rejected"] == 1
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        assert limiter.stats()["admitted"] == 2
+
+    asyncio.run(main())
+
+
+def test_per_session_cap_only_queues_that_session():
+    async def main():
+        limiter = ConcurrencyLimiter(max_concurrent=10, per_session=1)
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(limiter, "a", entered, release))
+        await entered.wait()
+
+        second_entered = asyncio.Event()
+        second = asyncio.create_task(hold(limiter, "a", second_entered, release))
+        await asyncio.sleep(0.05)
+        assert not second_entered.is_set()
+        assert limiter.stats()["waiting"] == 1
+
+        # Another session is admitted straight away
+        async with limiter.slot("b"):
+            assert limiter.stats()["active"] == 2
+
+        release.set()
+        await asyncio.gather(holder, second)
+        assert second_entered.is_set()
+        assert limiter.stats()["sessions"] == 0
+
+    asyncio.run(main())
+
+
+def test_cancellation_releases_slots():
+    async def main():
+        limiter = ConcurrencyLimiter(max_concurrent=1, per_session=1)
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(limiter, "a", entered, release))
+        await entered.wait()
+        waiter = asyncio.create_task(hold(limiter, "a", asyncio.Event(), release))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        holder.cancel()
+        await asyncio.gather(holder, waiter, return_exceptions=True)
+        assert limiter.stats() == dict(limiter.stats(), active=0, waiting=0, sessions=0)
+
+        # Both the global and the session slot are free again
+        async with asyncio.timeout(1):
+            async with limiter.slot("a"):
+                pass
+
+    asyncio.run(main())
+
+
+def test_deadline_bounds_the_wait():
+    async def main():
+        limiter = ConcurrencyLimiter(max_concurrent=1)
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(limiter, "a", entered, release))
+        await entered.wait()
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(TimeoutError):
+            async with limiter.slot("b", deadline=started + 0.1):
+                pass
+        assert loop.time() - started < 0.5
+        assert limiter.stats()["expired"] == 1 and limiter.stats()["waiting"] == 0
+
+        release.set()
+        await holder
+
+    asyncio.run(main())
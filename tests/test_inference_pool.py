@@ -0,0 +1,184 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.stubs import make_hf_app
+from conftest import stub_config
+from inference_pool import Backend, InferencePool
+
+MESSAGES = [{"role": "user", "content": "gm"}]
+
+
+@pytest.fixture
+def hf(serve):
+    def start(**overrides):
+        config = stub_config(**dict({"ttft_delay": 0.05, "token_delay": 0.01, "tokens": 5, "stop_rate": 0.0}, **overrides))
+        return serve(make_hf_app(config))
+
+    return start
+
+
+async def complete(pool):
+    stream = await pool.chat_completion(MESSAGES, max_tokens=64)
+    try:
+        tokens = [chunk.choices[0].delta.content async for chunk in stream]
+    finally:
+        await stream.aclose()
+    return stream.backend.name, tokens
+
+
+async def max_loop_lag(coroutine):
+    # Longest gap between ticks of a 10ms timer while `coroutine` runs
+    lag = 0.0
+    done = asyncio.Event()
+
+    async def tick():
+        nonlocal lag
+        while not done.is_set():
+            before = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.perf_counter() - before - 0.01)
+
+    ticker = asyncio.create_task(tick())
+    try:
+        result = await coroutine
+    finally:
+        done.set()
+        await ticker
+    return result, lag
+
+
+def test_503_fails_over_without_blocking_the_loop(hf):
+    loading = hf(hf_error_rate=1.0, hf_error_status=503)
+    healthy = hf()
+    pool = InferencePool([Backend("loading", loading.url), Backend("healthy", healthy.url)])
+
+    (winner, tokens), lag = asyncio.run(max_loop_lag(complete(pool)))
+
+    assert winner == "healthy" and len(tokens) == 5
+    assert pool.backends[0].stats["failures"] == 1
+    assert lag < 0.2
+    assert loading.stats()["requests"] == 1
+
+
+def test_timeout_bounds_first_token_not_the_stream(hf):
+    stalled = hf(ttft_delay=1.0)
+    # Streams for ~0.5s, well past the 0.3s first-token timeout
+    healthy = hf(tokens=50)
+    pool = InferencePool([Backend("stalled", stalled.url, timeout=0.3), Backend("healthy", healthy.url, timeout=0.3)])
+
+    winner, tokens = asyncio.run(complete(pool))
+
+    assert winner == "healthy" and len(tokens) == 50
+    assert pool.backends[0].stats["failures"] == 1
+
+
+def test_failed_backend_without_samples_ranks_behind_healthy():
+    failing, healthy = Backend("failing", "http://127.0.0.1:1"), Backend("healthy", "http://127.0.0.1:2")
+    pool = InferencePool([failing, healthy])
+    failing.record_failure(cooldown_after=3, cooldown=30)
+    failing.record_failure(cooldown_after=3, cooldown=30)
+    healthy.record_success(0.3)
+    assert pool.ranked() == [healthy, failing]
+
+
+def test_failover_ranking_moves_a_broken_backend_back(hf):
+    broken = hf(hf_error_rate=1.0)
+    healthy = hf()
+    # Cooldown off, so only the score keeps the broken backend out of first place
+    pool = InferencePool([Backend("broken", broken.url), Backend("healthy", healthy.url)], cooldown=0)
+
+    async def main():
+        return [await complete(pool) for _ in range(3)]
+
+    winners = [winner for winner, _ in asyncio.run(main())]
+    assert winners == ["healthy"] * 3
+    assert pool.stats()["failovers"] == 1
+    assert broken.stats()["requests"] == 1
+
+
+def test_hedge_beats_a_slow_primary(hf):
+    slow = hf(ttft_delay=1.0)
+    fast = hf()
+    pool = InferencePool([Backend("slow", slow.url), Backend("fast", fast.url)], hedge=True, hedge_min_delay=0.1)
+    # History says the slow one is quickest, so it goes first and gets hedged
+    pool.backends[0].observe_ttft(0.01)
+    pool.backends[1].observe_ttft(0.02)
+
+    winner, tokens = asyncio.run(complete(pool))
+
+    assert winner == "fast" and len(tokens) == 5
+    stats = pool.stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+    # The primary's wait is a lower bound on its TTFT, so its estimate goes up
+    assert pool.backends[0].ttft_ewma > 0.01
+    assert pool.backends[0].inflight == 0
+
+
+def test_losing_hedge_keeps_its_estimate(hf):
+    primary = hf(ttft_delay=0.4)
+    slow = hf(ttft_delay=2.0)
+    pool = InferencePool([Backend("primary", primary.url), Backend("slow", slow.url)], hedge=True, hedge_min_delay=0.1)
+    pool.backends[0].observe_ttft(0.01)
+    pool.backends[1].observe_ttft(2.0)
+
+    winner, _ = asyncio.run(complete(pool))
+
+    assert winner == "primary"
+    # The hedge was cut off after ~0.3s, which says nothing about a backend that takes 2s
+    assert pool.backends[1].ttft_ewma == 2.0
+    assert list(pool.backends[1].ttfts) == [2.0]
+
+
+def test_request_cancellation_records_nothing(hf):
+    slow = hf(ttft_delay=1.0)
+    pool = InferencePool([Backend("slow", slow.url)])
+
+    async def main():
+        task = asyncio.create_task(pool.chat_completion(MESSAGES))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    backend = pool.backends[0]
+    assert backend.ttft_ewma is None and not backend.ttfts
+    assert backend.inflight == 0
+
+
+def test_requests_share_the_backends_connections(hf):
+    healthy = hf()
+    pool = InferencePool([Backend("healthy", healthy.url, pool_size=4)])
+
+    async def main():
+        try:
+            for _ in range(3):
+                await complete(pool)
+            connector = pool.backends[0].session().connector
+            return connector.limit, sum(len(idle) for idle in connector._conns.values())
+        finally:
+            await pool.aclose()
+
+    # All three requests went over one kept-alive connection
+    assert asyncio.run(main()) == (4, 1)
+    assert healthy.stats()["requests"] == 3
+
+
+def test_closing_mid_stream_stops_the_server(hf):
+    long = hf(tokens=100)
+    pool = InferencePool([Backend("long", long.url)])
+
+    async def main():
+        try:
+            stream = await pool.chat_completion(MESSAGES)
+            await anext(stream)
+            await stream.aclose()
+            await asyncio.sleep(0.1)
+        finally:
+            await pool.aclose()
+
+    asyncio.run(main())
+    stats = long.stats()
+    assert stats["active"] == 0 and stats["tokens"] < 100
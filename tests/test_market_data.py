@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import aiohttp
+import pytest
+import requests
+
+from benchmarks.stubs import make_cmc_app
+from conftest import stub_config
+from market_data import MarketDataProvider
+
+
+@pytest.fixture
+def cmc(serve):
+    config = stub_config(cmc_latency=0.05, coins=50)
+    server = serve(make_cmc_app(config))
+    server.config = config
+    return server
+
+
+@pytest.fixture
+def provider(cmc):
+    providers = []
+
+    def make(**options):
+        options.setdefault("refresh_interval", 0)
+        provider = MarketDataProvider("test-key", base_url=cmc.url, **options)
+        providers.append(provider)
+        return provider
+
+    yield make
+    for provider in providers:
+        provider.stop()
+
+
+def test_ttl_hit_and_miss(cmc, provider):
+    market_data = provider(ttl=0.3)
+    first = market_data.listings(limit=5)
+    assert market_data.listings(limit=5) == first
+    assert cmc.stats()["requests"] == 1
+
+    time.sleep(0.35)
+    market_data.listings(limit=5)
+    assert cmc.stats()["requests"] == 2
+    stats = market_data.stats()
+    assert (stats["cache_hits"], stats["cache_misses"]) == (1, 2)
+
+
+def test_concurrent_misses_share_one_request(cmc, provider):
+    cmc.config.cmc_latency = 0.2
+    market_data = provider()
+    barrier = threading.Barrier(10)
+    results = []
+
+    def call():
+        barrier.wait()
+        results.append(market_data.listings(limit=5))
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 10 and all(result == results[0] for result in results)
+    assert cmc.stats()["requests"] == 1
+    assert market_data.stats()["coalesced"] == 9
+
+
+def test_concurrent_async_misses_share_one_request(cmc, provider):
+    cmc.config.cmc_latency = 0.2
+    market_data = provider()
+
+    async def main():
+        try:
+            return await asyncio.gather(*(market_data.alistings(limit=5) for _ in range(10)))
+        finally:
+            await market_data.aclose()
+
+    results = asyncio.run(main())
+    assert all(result == results[0] for result in results)
+    assert cmc.stats()["requests"] == 1
+    assert market_data.stats()["coalesced"] == 9
+
+
+def test_serves_stale_while_upstream_fails(cmc, provider):
+    market_data = provider(ttl=0.1, max_stale=5)
+    first = market_data.listings(limit=5)
+    cmc.config.cmc_error_rate = 1.0
+    time.sleep(0.15)
+
+    assert market_data.listings(limit=5) == first
+    stats = market_data.stats()
+    assert stats["stale_served"] == 1 and stats["upstream_errors"] == 1
+
+
+def test_raises_once_past_max_stale(cmc, provider):
+    market_data = provider(ttl=0.1, max_stale=0.2)
+    market_data.listings(limit=5)
+    cmc.config.cmc_error_rate = 1.0
+    time.sleep(0.3)
+
+    with pytest.raises(requests.HTTPError):
+        market_data.listings(limit=5)
+
+    async def main():
+        try:
+            await market_data.alistings(limit=5)
+        finally:
+            await market_data.aclose()
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(main())
+    assert market_data.stats()["stale_served"] == 0
+
+
+def test_refresher_refetches_keys_in_use(cmc, provider):
+    market_data = provider(ttl=0.4, refresh_interval=0.1, idle_timeout=5)
+    market_data.listings(limit=5)
+    time.sleep(1.0)
+
+    refreshed = cmc.stats()["requests"]
+    assert refreshed >= 3
+    # Still fresh thanks to the refresher, so this is a hit
+    market_data.listings(limit=5)
+    assert market_data.stats()["cache_hits"] == 1
+
+
+def test_refresher_leaves_idle_keys_alone(cmc, provider):
+    market_data = provider(ttl=0.2, refresh_interval=0.1, idle_timeout=0.05)
+    market_data.listings(limit=5)
+    time.sleep(0.6)
+    assert cmc.stats()["requests"] == 1
@@ -0,0 +1,93 @@
+import numpy as np
+
+from benchmarks.stubs import fake_listings
+from market_snapshot import MarketSnapshot
+
+
+class FakeProvider:
+    # Serves pages of `listings` the way MarketDataProvider.fetch returns them
+    def __init__(self, listings):
+        self.listings = listings
+
+    def fetch(self, path, params=None):
+        start, limit = int(params["start"]), int(params["limit"])
+        return {"data": self.listings[start - 1:start - 1 + limit]}
+
+
+def snapshot_of(listings, size=20, page_size=10):
+    snapshot = MarketSnapshot(FakeProvider(listings), size=size, page_size=page_size, refresh_interval=0)
+    snapshot.load()
+    return snapshot
+
+
+def test_top_matches_a_full_sort():
+    listings = fake_listings(50)
+    snapshot = snapshot_of(listings, size=50, page_size=20)
+
+    for ascending in (False, True):
+        expected = sorted(listings, key=lambda coin: coin["quote"]["USD"]["percent_change_24h"], reverse=not ascending)
+        top = snapshot.top("percent_change_24h", 5, ascending=ascending)
+        assert [coin["symbol"] for coin in top] == [coin["symbol"] for coin in expected[:5]]
+
+
+def test_filters_and_quote():
+    snapshot = snapshot_of(fake_listings(50), size=50, page_size=50)
+    top = snapshot.top("percent_change_1h", 10, min_volume=1e7, min_market_cap=1e8)
+    assert all(coin["volume_24h"] >= 1e7 and coin["market_cap"] >= 1e8 for coin in top)
+    assert snapshot.quote("sol")["name"] == "Solana"
+    assert snapshot.quote("NOPE") is None
+
+
+def test_refresh_updates_quotes_in_place():
+    listings = fake_listings(20)
+    snapshot = snapshot_of(listings)
+    listings[1]["quote"]["USD"]["price"] = 1.5
+    snapshot.refresh_page()
+    assert snapshot.quote("ETH")["price"] == 1.5
+    assert snapshot.membership_version == 1
+
+
+def test_coins_missing_for_two_sweeps_are_dropped():
+    listings = fake_listings(21)
+    pumped = listings[5]
+    pumped["quote"]["USD"]["percent_change_1h"] = 500.0
+    provider = FakeProvider(listings)
+    snapshot = MarketSnapshot(provider, size=20, page_size=10, refresh_interval=0)
+    snapshot.load()
+    assert snapshot.top("percent_change_1h", 1)[0]["symbol"] == pumped["symbol"]
+
+    # It falls out of the top 20 and the next coin takes its place
+    provider.listings = listings[:5] + listings[6:]
+    snapshot.refresh_page()
+    snapshot.refresh_page()
+    assert snapshot.quote(pumped["symbol"]) is not None
+    snapshot.refresh_page()
+    snapshot.refresh_page()
+
+    assert snapshot.quote(pumped["symbol"]) is None
+    assert pumped["symbol"] not in [coin["symbol"] for coin in snapshot.top("percent_change_1h", 20)]
+    assert (pumped["symbol"], pumped["name"]) not in snapshot.coins()
+    assert snapshot.stats()["coins"] == 20
+    assert snapshot.stats()["dropped"] == 1
+    assert snapshot.membership_version == 3
+    assert not np.isin(pumped["id"], snapshot._table.ids)
+
+
+def test_coin_changing_pages_mid_sweep_is_kept():
+    listings = fake_listings(20)
+    provider = FakeProvider(listings)
+    snapshot = MarketSnapshot(provider, size=20, page_size=10, refresh_interval=0)
+    snapshot.load()
+    snapshot.refresh_page()
+
+    # Climbs from rank 12 into page 1 right after page 1 was fetched, so this sweep never sees it
+    climber = listings[11]
+    provider.listings = listings[:4] + [climber] + listings[4:11] + listings[12:]
+    snapshot.refresh_page()
+    assert snapshot.quote(climber["symbol"]) is not None
+
+    snapshot.refresh_page()
+    snapshot.refresh_page()
+    assert snapshot.quote(climber["symbol"]) is not None
+    assert snapshot.stats()["dropped"] == 0
+    assert snapshot.membership_version == 1
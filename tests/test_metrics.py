@@ -0,0 +1,45 @@
+import asyncio
+import re
+
+from fastapi.testclient import TestClient
+
+SAMPLE = re.compile(r"^(\w+)(\{.*\})? (\S+)$")
+
+
+def scrape(app):
+    response = TestClient(app.create_server()).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == app.metrics.CONTENT_TYPE
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, labels, value = SAMPLE.match(line).groups()
+            samples[name + (labels or "")] = float(value)
+    return samples
+
+
+async def reply(app, message):
+    return [part async for part in app.respond(message, [], "You are Phil.", 64, 0.7, 0.95)]
+
+
+def test_request_increments_the_request_counter(app):
+    series = 'phillip_requests_total{route="top_movers",outcome="ok"}'
+    before = scrape(app).get(series, 0)
+    asyncio.run(reply(app, "top gainers"))
+    assert scrape(app)[series] == before + 1
+
+
+def test_histogram_buckets_are_cumulative(app):
+    asyncio.run(reply(app, "gm"))
+    samples = scrape(app)
+
+    buckets = [
+        (key, value) for key, value in samples.items()
+        if key.startswith('phillip_request_seconds_bucket{route="llm"')
+    ]
+    bounds = [re.search(r'le="([^"]+)"', key).group(1) for key, _ in buckets]
+    counts = [value for _, value in buckets]
+    assert bounds[-1] == "+Inf"
+    assert [float(bound) for bound in bounds] == sorted(float(bound) for bound in bounds)
+    assert counts == sorted(counts)
+    assert counts[-1] == samples['phillip_request_seconds_count{route="llm"}'] >= 1
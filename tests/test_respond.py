@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+
+async def drive(generator):
+    # Gradio resumes the generator from a fresh task on every step
+    replies = []
+    while True:
+        try:
+            replies.append(await asyncio.create_task(anext(generator)))
+        except StopAsyncIteration:
+            return replies
+
+
+def respond(app, message):
+    return app.respond(message, [], "You are Phil.", 64, 0.7, 0.95)
+
+
+def test_streams_across_tasks(app):
+    replies = asyncio.run(drive(respond(app, "gm bro")))
+    assert len(replies) > 1
+    assert replies[-1] and not replies[-1].startswith(("Error:", "Phil took too long"))
+
+
+def test_deadline_cuts_off_a_slow_stream(app, monkeypatch):
+    monkeypatch.setattr(app, "REQUEST_DEADLINE", 0.2)
+    replies = asyncio.run(drive(respond(app, "tell me a long story")))
+    # Whatever streamed before the deadline is kept as the reply
+    assert replies[-1] == replies[-2].strip()
+    assert len(replies[-1].split()) < app.config.tokens
+
+
+def test_data_route_deadline_does_not_outlive_the_reply(app, monkeypatch):
+    monkeypatch.setattr(app, "REQUEST_DEADLINE", 0.3)
+
+    async def main():
+        generator = respond(app, "top gainers")
+        reply = await anext(generator)
+        # This task moves on after the reply; a deadline still armed around the yield
+        # would cancel it here, long after the reply was delivered
+        await asyncio.sleep(0.5)
+        with pytest.raises(StopAsyncIteration):
+            await asyncio.create_task(anext(generator))
+        return reply
+
+    reply = asyncio.run(main())
+    assert "1h Change" in reply
+
+
+def test_records_trimmed_turns_per_request(app):
+    def observed():
+        _, total, count = app.metrics.CONTEXT_TURNS_TRIMMED._series.get((), (None, 0.0, 0))
+        return total, count
+
+    history = [["wen moon " * 200, "soon bro " * 200] for _ in range(10)]
+    trimmed_before = app.context_manager.stats()["turns_trimmed"]
+    total_before, count_before = observed()
+    asyncio.run(drive(app.respond("gm", history, "You are Phil.", 64, 0.7, 0.95)))
+
+    trimmed = app.context_manager.stats()["turns_trimmed"] - trimmed_before
+    total, count = observed()
+    assert trimmed > 0
+    assert (total - total_before, count - count_before) == (trimmed, 1)
+
+
+def test_counts_tokens_wasted_on_a_stop_sequence(app, monkeypatch):
+    # Every reply drifts into "User:" somewhere; the token carrying it is thrown away
+    monkeypatch.setattr(app.config, "stop_rate", 1.0)
+    before = app.stream_stats.stats()
+    replies = asyncio.run(drive(respond(app, "gm fam")))
+    after = app.stream_stats.stats()
+
+    assert "User:" not in replies[-1]
+    assert after["early_stops"] - before["early_stops"] == 1
+    assert after["tokens_wasted"] - before["tokens_wasted"] == 1
+
+
+def test_deadline_covers_the_queue(app, monkeypatch):
+    monkeypatch.setattr(app, "REQUEST_DEADLINE", 0.2)
+    monkeypatch.setattr(app, "limiter", app.ConcurrencyLimiter(max_concurrent=1))
+
+    async def main():
+        async with app.limiter.slot("someone-else"):
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            replies = await drive(respond(app, "gm"))
+            return replies, loop.time() - started
+
+    replies, elapsed = asyncio.run(main())
+    assert replies == ["Phil took too long to answer bro, try again."]
+    assert elapsed < 0.5
+
+
+def test_prices_read_as_plain_decimals(app):
+    assert app._price_text(68123.456) == "$68,123.46"
+    assert app._price_text(0.5) == "$0.5000"
+    assert app._price_text(0.0000096210345) == "$0.000009621"
+    assert app._price_text(0.0) == "$0.00"
+    assert app._price_text(float("nan")) == "n/a"
@@ -0,0 +1,37 @@
+import sqlite3
+import time
+
+from response_cache import ResponseCache
+
+
+def test_sqlite_write_through_survives_restart(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(max_entries=2, ttl=60, path=path)
+    for index in range(3):
+        cache.put(f"key{index}", f"reply{index}", 0.5)
+    cache.flush()
+    assert cache.stats()["db_commits"] >= 1
+
+    restored = ResponseCache(max_entries=2, ttl=60, path=path)
+    # key0 was evicted by the LRU, and the delete was persisted too
+    assert restored.get("key0", 0.1) is None
+    assert restored.get("key2", 0.1) == "reply2"
+
+
+def test_put_does_not_wait_for_the_disk(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(ttl=60, path=path)
+    # Another connection holds the database lock, so the writer is stuck waiting on it
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN EXCLUSIVE")
+    try:
+        started = time.perf_counter()
+        for index in range(200):
+            cache.put(f"key{index}", "gm bro", 0.5)
+        assert time.perf_counter() - started < 0.5
+        assert cache.get("key199", 0.1) == "gm bro"
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+    cache.flush()
+    assert cache.stats()["db_errors"] == 0
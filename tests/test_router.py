@@ -0,0 +1,57 @@
+import pytest
+
+from router import LLM, QUOTE, TOP_MOVERS, IntentRouter, Route
+
+COINS = [
+    ("BTC", "Bitcoin"), ("ETH", "Ethereum"), ("SOL", "Solana"), ("PEPE", "Pepe"), ("SHIB", "Shiba Inu"),
+    # Ranked outside the well-known set, with names and tickers that are everyday words
+    ("TIME", "Chrono.tech"), ("GAS", "Gas"), ("SLEEP", "Sleepless AI"), ("SUPER", "SuperVerse"), ("CALM", "Calm Coin"),
+]
+
+
+@pytest.fixture
+def router():
+    router = IntentRouter(well_known=5)
+    router.update_lexicon(COINS)
+    return router
+
+
+@pytest.mark.parametrize("message, route", [
+    ("$PEPE", Route(QUOTE, "PEPE")),
+    ("$pepe to the moon", Route(QUOTE, "PEPE")),
+    ("$WIF looking spicy", Route(QUOTE, "WIF")),
+    ("solana price", Route(QUOTE, "SOL")),
+    ("what's the price of shiba inu?", Route(QUOTE, "SHIB")),
+    ("how much is eth worth rn", Route(QUOTE, "ETH")),
+    ("GAS price?", Route(QUOTE, "GAS")),
+    ("ngl went to the supermarket, how much is bitcoin now", Route(QUOTE, "BTC")),
+])
+def test_quotes(router, message, route):
+    assert router.route(message) == route
+
+
+@pytest.mark.parametrize("message, route", [
+    ("what's pumping", Route(TOP_MOVERS)),
+    ("top coins today", Route(TOP_MOVERS, field="percent_change_24h")),
+    ("24h losers?", Route(TOP_MOVERS, field="percent_change_24h", ascending=True)),
+    ("best gainers this week", Route(TOP_MOVERS, field="percent_change_7d")),
+    ("top volume", Route(TOP_MOVERS, field="volume_24h")),
+])
+def test_top_movers(router, message, route):
+    assert router.route(message) == route
+
+
+@pytest.mark.parametrize("message", [
+    "gm bro",
+    "I went to the supermarket",
+    "I have $100, what should I do with it",
+    "what coin should I learn about first",
+    "the market is wild, how do I stay calm",
+    "how much time do I have",
+    "what's the price of gas lol",
+    "how much sleep do you get",
+    "how much did you lose on bitcoin last year bro",
+    "bitcoin is the future",
+])
+def test_everything_else_goes_to_the_llm(router, message):
+    assert router.route(message) == Route(LLM)
@@ -0,0 +1,61 @@
+from streaming import StopSequenceMatcher, StreamStats
+
+
+def feed_all(matcher, chunks):
+    return [matcher.feed(chunk) for chunk in chunks]
+
+
+def test_passes_plain_text_through():
+    matcher = StopSequenceMatcher()
+    assert feed_all(matcher, ["gm", " bro", " lfg"]) == ["gm", " bro", " lfg"]
+    assert not matcher.stopped and matcher.flush() == ""
+
+
+def test_stop_sequence_split_across_chunks():
+    matcher = StopSequenceMatcher()
+    assert feed_all(matcher, ["wagmi <|us", "er|> wen moon"]) == ["wagmi ", ""]
+    assert matcher.stopped
+
+    matcher = StopSequenceMatcher()
+    assert feed_all(matcher, ["ngl\n\nUs", "er: hi"]) == ["ngl\n\n", ""]
+    assert matcher.stopped
+
+
+def test_nothing_is_released_after_a_stop():
+    matcher = StopSequenceMatcher()
+    assert matcher.feed("ok User: what") == "ok "
+    assert matcher.feed(" more text") == ""
+    assert matcher.flush() == ""
+
+
+def test_false_positive_prefix_is_released():
+    matcher = StopSequenceMatcher()
+    assert matcher.feed("love you <") == "love you "
+    assert matcher.pending == "<"
+    assert matcher.feed("3") == "<3"
+    assert matcher.pending == "" and not matcher.stopped
+
+    matcher = StopSequenceMatcher()
+    assert feed_all(matcher, ["Use", "ful"]) == ["", "Useful"]
+
+
+def test_flush_returns_held_text_at_end_of_stream():
+    matcher = StopSequenceMatcher()
+    assert matcher.feed("see ya <|u") == "see ya "
+    assert matcher.flush() == "<|u"
+    assert matcher.pending == "" and not matcher.stopped
+
+
+def test_stream_stats_accumulate():
+    stats = StreamStats()
+    stats.record(0.2, tokens_received=10, tokens_wasted=0, stopped=False)
+    stats.record(0.4, tokens_received=8, tokens_wasted=2, stopped=True)
+    stats.record(None, tokens_received=0, tokens_wasted=0, stopped=False)
+
+    totals = stats.stats()
+    assert totals["streams"] == 3
+    assert totals["early_stops"] == 1
+    assert (totals["tokens_received"], totals["tokens_wasted"]) == (18, 2)
+    assert totals["ttft_count"] == 2
+    assert abs(totals["ttft_avg"] - 0.3) < 1e-9
+    assert totals["ttft_max"] == 0.4